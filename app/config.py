@@ -26,6 +26,74 @@ SESSION_EXPIRES_HOURS = int(os.getenv("SESSION_EXPIRES_HOURS", "12"))
 SESSION_COOKIE_DOMAIN = os.getenv("SESSION_COOKIE_DOMAIN") or None
 SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true"
 
+# Backend de datos: "firebase" (producción) o "memory" (desarrollo / benchmarks)
+DATA_BACKEND = os.getenv("DATA_BACKEND", "firebase").lower()
+MEMORY_BACKEND_LATENCY_MS = float(os.getenv("MEMORY_BACKEND_LATENCY_MS", "0"))
+# Crea los clientes (Firebase/OpenAI/Supabase) en segundo plano al arrancar; si es false, en el primer uso
+WARM_CLIENTS_ON_STARTUP = os.getenv("WARM_CLIENTS_ON_STARTUP", "true").lower() == "true"
+# Carritos con snapshot desnormalizado de cada ítem (revalidado contra el índice de versiones)
+CART_SNAPSHOTS_ENABLED = os.getenv("CART_SNAPSHOTS_ENABLED", "true").lower() == "true"
+PRODUCT_VERSION_INDEX_TTL_SECONDS = float(os.getenv("PRODUCT_VERSION_INDEX_TTL_SECONDS", "2"))
+# Shards del índice de versiones (catalog_meta/product_versions_<i>): reparte las escrituras
+# (~1 escritura/s sostenida por documento) y el tamaño (1 MiB por documento). Cambiarlo exige
+# borrar los shards y dejar que el backfill los reconstruya.
+PRODUCT_VERSION_INDEX_SHARDS = int(os.getenv("PRODUCT_VERSION_INDEX_SHARDS", "16"))
+# Admisión: rate limit (token bucket) y concurrencia de endpoints costosos
+RAG_SYNC_RATE_PER_MINUTE = float(os.getenv("RAG_SYNC_RATE_PER_MINUTE", "1"))
+RAG_SYNC_BURST = int(os.getenv("RAG_SYNC_BURST", "1"))
+UPLOAD_RATE_PER_MINUTE = float(os.getenv("UPLOAD_RATE_PER_MINUTE", "30"))
+UPLOAD_BURST = int(os.getenv("UPLOAD_BURST", "10"))
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "8"))
+UPLOAD_MAX_QUEUE = int(os.getenv("UPLOAD_MAX_QUEUE", "16"))
+UPLOAD_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_QUEUE_TIMEOUT_SECONDS", "10"))
+# Endpoints públicos (sin sesión): token bucket por IP compartido entre ellos; 0 (por defecto) lo desactiva
+PUBLIC_RATE_PER_MINUTE = float(os.getenv("PUBLIC_RATE_PER_MINUTE", "0"))
+PUBLIC_BURST = int(os.getenv("PUBLIC_BURST", "100"))
+# Proxies de confianza delante del servicio: la IP del cliente es la entrada de X-Forwarded-For
+# a esa distancia desde la derecha. 0 = usar la IP del socket (p.ej. uvicorn --proxy-headers)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+# Resync completo del RAG: tamaño de página (= granularidad del checkpoint) y heartbeat
+RAG_RESYNC_PAGE_SIZE = int(os.getenv("RAG_RESYNC_PAGE_SIZE", "50"))
+RAG_RESYNC_STALE_SECONDS = float(os.getenv("RAG_RESYNC_STALE_SECONDS", "120"))
+# Snapshot columnar del catálogo en un archivo mmap compartido entre workers ("" = desactivado)
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "")
+CATALOG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", "10"))
+CATALOG_SNAPSHOT_CHECK_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_CHECK_SECONDS", "1"))
+# Listados servidos desde índices ordenados en memoria (sort por precio/nombre, rango de precio)
+CATALOG_INDEX_ENABLED = os.getenv("CATALOG_INDEX_ENABLED", "true").lower() == "true"
+# Change feed del catálogo (/api/products/changes)
+CHANGE_FEED_SAFETY_LAG_SECONDS = float(os.getenv("CHANGE_FEED_SAFETY_LAG_SECONDS", "2"))
+CHANGE_FEED_TOMBSTONE_RETENTION_DAYS = float(os.getenv("CHANGE_FEED_TOMBSTONE_RETENTION_DAYS", "30"))
+# Cada cuánto purga tombstones el scheduler del lifespan (0 = nunca)
+CHANGE_FEED_COMPACT_INTERVAL_SECONDS = float(os.getenv("CHANGE_FEED_COMPACT_INTERVAL_SECONDS", "3600"))
+# Inventario (stock) en documentos propios, con caché corta por proceso
+INVENTORY_CACHE_TTL_SECONDS = float(os.getenv("INVENTORY_CACHE_TTL_SECONDS", "2"))
+# Diagnóstico: top-N de peticiones lentas (activable en caliente desde /api/admin/profiling)
+SLOW_REQUESTS_ENABLED = os.getenv("SLOW_REQUESTS_ENABLED", "false").lower() == "true"
+SLOW_REQUESTS_CAPACITY = int(os.getenv("SLOW_REQUESTS_CAPACITY", "20"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "30"))
+# Bulkheads por backend: hilos (o llamadas async en vuelo), cola máxima y timeout total
+BULKHEAD_FIRESTORE_SIZE = int(os.getenv("BULKHEAD_FIRESTORE_SIZE", "32"))
+BULKHEAD_FIRESTORE_QUEUE = int(os.getenv("BULKHEAD_FIRESTORE_QUEUE", "256"))
+BULKHEAD_FIRESTORE_TIMEOUT_SECONDS = float(os.getenv("BULKHEAD_FIRESTORE_TIMEOUT_SECONDS", "15"))
+BULKHEAD_RAG_SIZE = int(os.getenv("BULKHEAD_RAG_SIZE", "4"))
+BULKHEAD_RAG_QUEUE = int(os.getenv("BULKHEAD_RAG_QUEUE", "32"))
+BULKHEAD_RAG_TIMEOUT_SECONDS = float(os.getenv("BULKHEAD_RAG_TIMEOUT_SECONDS", "20"))
+BULKHEAD_IMAGES_SIZE = int(os.getenv("BULKHEAD_IMAGES_SIZE", "8"))
+BULKHEAD_IMAGES_QUEUE = int(os.getenv("BULKHEAD_IMAGES_QUEUE", "32"))
+BULKHEAD_IMAGES_TIMEOUT_SECONDS = float(os.getenv("BULKHEAD_IMAGES_TIMEOUT_SECONDS", "60"))
+# Índice local SHA-256 → URL para no re-subir imágenes idénticas; máximo de imágenes por galería
+IMAGE_DEDUP_INDEX_SIZE = int(os.getenv("IMAGE_DEDUP_INDEX_SIZE", "4096"))
+PRODUCT_GALLERY_MAX_IMAGES = int(os.getenv("PRODUCT_GALLERY_MAX_IMAGES", "10"))
+# Máximo de IDs (distintos) por llamada a /api/products/batch
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", "300"))
+# Compactación de carritos: TTL de inactividad, página, ritmo (carritos/seg) y programación (0 = solo manual)
+CART_IDLE_TTL_DAYS = float(os.getenv("CART_IDLE_TTL_DAYS", "60"))
+CART_COMPACTION_PAGE_SIZE = int(os.getenv("CART_COMPACTION_PAGE_SIZE", "200"))
+CART_COMPACTION_RATE_PER_SECOND = float(os.getenv("CART_COMPACTION_RATE_PER_SECOND", "200"))
+CART_COMPACTION_STALE_SECONDS = float(os.getenv("CART_COMPACTION_STALE_SECONDS", "120"))
+CART_COMPACTION_INTERVAL_HOURS = float(os.getenv("CART_COMPACTION_INTERVAL_HOURS", "0"))
+
 IMAGE_SERVICE_BASE_URL = os.getenv(
     "IMAGE_SERVICE_BASE_URL",
     "https://images-services-ucb-commerce.vercel.app"
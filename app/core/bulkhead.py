@@ -0,0 +1,166 @@
+# app/core/bulkhead.py
+"""
+Bulkheads: un pool acotado por backend (Firestore, RAG, servicio de imágenes).
+
+Los handlers ya no comparten el threadpool por defecto de Starlette: cada backend tiene
+su propio ejecutor con `size` hilos y una cola de como mucho `max_queue` tareas. Si la
+cola está llena se rechaza de inmediato (`Overloaded`) y si la tarea no termina en
+`timeout` segundos (contando la espera en cola) se corta la espera (`BulkheadTimeout`).
+Así, un OpenAI lento agota solo el bulkhead del RAG y no las lecturas del carrito.
+
+Para trabajo async (httpx) el mismo contrato se aplica con un semáforo en el loop.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.ratelimit import Overloaded
+from app.config import (
+    BULKHEAD_FIRESTORE_SIZE, BULKHEAD_FIRESTORE_QUEUE, BULKHEAD_FIRESTORE_TIMEOUT_SECONDS,
+    BULKHEAD_RAG_SIZE, BULKHEAD_RAG_QUEUE, BULKHEAD_RAG_TIMEOUT_SECONDS,
+    BULKHEAD_IMAGES_SIZE, BULKHEAD_IMAGES_QUEUE, BULKHEAD_IMAGES_TIMEOUT_SECONDS,
+)
+
+T = TypeVar("T")
+
+
+class BulkheadTimeout(Exception):
+    """La tarea no terminó dentro del timeout del bulkhead (el hilo puede seguir corriendo)."""
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name}: timeout tras {timeout}s")
+        self.name = name
+        self.timeout = timeout
+
+
+class Bulkhead:
+    def __init__(self, name: str, size: int, max_queue: int, timeout: float):
+        self.name = name
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    # -- contabilidad --------------------------------------------------------
+    def _admit(self) -> None:
+        with self._lock:
+            if self.active + self.queued >= self.size + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(retry_after=max(1.0, min(self.timeout, 5.0)))
+            self.queued += 1
+
+    def _started(self) -> None:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+
+    def _finished(self, started: bool) -> None:
+        with self._lock:
+            if started:
+                self.active -= 1
+                self.completed += 1
+            else:
+                self.queued -= 1
+
+    def _timed_out(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    # -- trabajo bloqueante --------------------------------------------------
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.size, thread_name_prefix=f"bulkhead-{self.name}")
+        return self._executor
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        """Encola `fn` en el pool del bulkhead; `Overloaded` si la cola está llena."""
+        self._admit()
+        ctx = contextvars.copy_context()  # conserva el trace de profiling, etc.
+
+        def _task():
+            self._started()
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                self._finished(started=True)
+
+        fut = self._pool().submit(_task)
+        # si se cancela antes de arrancar, `_task` nunca corre: liberamos su lugar en la cola
+        fut.add_done_callback(lambda f: f.cancelled() and self._finished(started=False))
+        return fut
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Ejecuta `fn` (bloqueante) en el bulkhead y espera sin bloquear el loop."""
+        fut = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout=self.timeout or None)
+        except asyncio.TimeoutError:
+            self._timed_out()
+            raise BulkheadTimeout(self.name, self.timeout)
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Variante para hilos (jobs en segundo plano)."""
+        fut = self.submit(fn, *args, **kwargs)
+        try:
+            return fut.result(timeout=self.timeout or None)
+        except FutureTimeout:
+            fut.cancel()
+            self._timed_out()
+            raise BulkheadTimeout(self.name, self.timeout)
+
+    # -- trabajo async -------------------------------------------------------
+    async def run_async(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Ejecuta la corrutina `fn(...)` con como mucho `size` en vuelo (semáforo en el loop)."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.size)
+        self._admit()
+        started = False
+        try:
+            async def _guarded():
+                nonlocal started
+                async with self._sem:
+                    self._started()
+                    started = True
+                    return await fn(*args, **kwargs)
+
+            return await asyncio.wait_for(_guarded(), timeout=self.timeout or None)
+        except asyncio.TimeoutError:
+            self._timed_out()
+            raise BulkheadTimeout(self.name, self.timeout)
+        finally:
+            self._finished(started)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "max_queue": self.max_queue,
+                "timeout_s": self.timeout,
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+
+firestore = Bulkhead("firestore", BULKHEAD_FIRESTORE_SIZE, BULKHEAD_FIRESTORE_QUEUE, BULKHEAD_FIRESTORE_TIMEOUT_SECONDS)
+rag = Bulkhead("rag", BULKHEAD_RAG_SIZE, BULKHEAD_RAG_QUEUE, BULKHEAD_RAG_TIMEOUT_SECONDS)
+images = Bulkhead("images", BULKHEAD_IMAGES_SIZE, BULKHEAD_IMAGES_QUEUE, BULKHEAD_IMAGES_TIMEOUT_SECONDS)
+
+ALL = (firestore, rag, images)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {b.name: b.stats() for b in ALL}
@@ -0,0 +1,207 @@
+# app/core/catalog_index.py
+"""
+Índices secundarios en memoria para el listado de productos.
+
+Por cada partición (categoría, carrera) — incluidas las parciales (cat, *), (*, carrera)
+y (*, *) — se mantiene un arreglo ordenado de claves `(valor, id)` por cada criterio de
+orden (precio, nombre, más nuevos). Los rangos de precio se resuelven con bisect y los
+cursores son la última clave devuelta, así que no se desplazan si entran o salen
+productos entre páginas. Las escrituras actualizan los arreglos de forma incremental.
+"""
+import base64
+import bisect
+import heapq
+import json
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+from app.core.catalog_snapshot import to_micros
+
+# órdenes de listado admitidos (el router los usa como tipo del query param `sort`)
+SortOption = Literal["newest", "price_asc", "price_desc", "name"]
+_ORDERS = ("newest", "price", "name")
+_MAX_ID = "\U0010ffff"
+
+Key = Tuple[Any, str]
+
+
+def _order_for(sort: str) -> str:
+    return "price" if sort in ("price_asc", "price_desc") else sort
+
+
+def _key(order: str, product: Dict[str, Any]) -> Key:
+    pid = product["id"]
+    if order == "price":
+        return (float(product.get("price") or 0.0), pid)
+    if order == "name":
+        return ((product.get("name") or "").casefold(), pid)
+    return (-(to_micros(product.get("createdAt")) or 0), pid)
+
+
+def encode_cursor(sort: str, key: Key) -> str:
+    raw = json.dumps([sort, key[0], key[1]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+# tipo del valor de la clave según el criterio de orden (bool se descarta aparte: es int)
+_VALUE_TYPES = {"price": (int, float), "newest": int, "name": str}
+
+
+def decode_cursor(sort: str, cursor: Optional[str]) -> Optional[Key]:
+    """
+    Cursor opaco → clave; None si no aplica (otro orden). Acepta también el cursor ISO
+    (createdAt) previo. Un cursor con tipos que no corresponden al orden → ValueError.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cur_sort, value, pid = json.loads(raw)
+    except Exception:
+        cur_sort = None
+    if cur_sort is not None:
+        if cur_sort != sort:
+            return None
+        order = _order_for(sort)
+        if isinstance(value, bool) or not isinstance(value, _VALUE_TYPES[order]) or not isinstance(pid, str):
+            raise ValueError("Cursor de paginación inválido")
+        return (float(value) if order == "price" else value, pid)
+    if sort == "newest":
+        from datetime import datetime
+
+        try:
+            # cursor legado de Firestore: start_after(createdAt)
+            return (-to_micros(datetime.fromisoformat(cursor)), _MAX_ID)
+        except Exception:
+            return None
+    return None
+
+
+class CatalogIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._lists: Dict[Tuple[Optional[str], Optional[str], str], List[Key]] = {}
+        self.loaded = False
+
+    @staticmethod
+    def _partitions(product: Dict[str, Any]):
+        cat, car = product.get("category"), product.get("career")
+        return ((None, None), (cat, None), (None, car), (cat, car))
+
+    def _insert(self, product: Dict[str, Any]) -> None:
+        for cat, car in self._partitions(product):
+            for order in _ORDERS:
+                bisect.insort(self._lists.setdefault((cat, car, order), []), _key(order, product))
+
+    def _delete(self, product: Dict[str, Any]) -> None:
+        for cat, car in self._partitions(product):
+            for order in _ORDERS:
+                lst = self._lists.get((cat, car, order))
+                if not lst:
+                    continue
+                key = _key(order, product)
+                i = bisect.bisect_left(lst, key)
+                if i < len(lst) and lst[i] == key:
+                    del lst[i]
+
+    def load(self, products: Iterable[Dict[str, Any]]) -> None:
+        """Reconstruye todo (ordenando una vez, no insertando de a uno)."""
+        items = {p["id"]: dict(p) for p in products}
+        lists: Dict[Tuple[Optional[str], Optional[str], str], List[Key]] = {}
+        for p in items.values():
+            for cat, car in self._partitions(p):
+                for order in _ORDERS:
+                    lists.setdefault((cat, car, order), []).append(_key(order, p))
+        for lst in lists.values():
+            lst.sort()
+        with self._lock:
+            self.products, self._lists, self.loaded = items, lists, True
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        with self._lock:
+            old = self.products.get(product["id"])
+            if old is not None:
+                self._delete(old)
+            self.products[product["id"]] = dict(product)
+            self._insert(product)
+
+    def remove(self, prod_id: str) -> None:
+        with self._lock:
+            old = self.products.pop(prod_id, None)
+            if old is not None:
+                self._delete(old)
+
+    def _iter_partition(
+        self,
+        lst: List[Key],
+        sort: str,
+        after: Optional[Key],
+        min_price: Optional[float],
+        max_price: Optional[float],
+    ) -> Iterator[Key]:
+        lo, hi = 0, len(lst)
+        if sort in ("price_asc", "price_desc"):
+            if min_price is not None:
+                lo = bisect.bisect_left(lst, (float(min_price), ""))
+            if max_price is not None:
+                hi = bisect.bisect_right(lst, (float(max_price), _MAX_ID))
+            if after is not None:
+                if sort == "price_asc":
+                    lo = max(lo, bisect.bisect_right(lst, after))
+                else:
+                    hi = min(hi, bisect.bisect_left(lst, after))
+            rng = range(lo, hi) if sort == "price_asc" else range(hi - 1, lo - 1, -1)
+            return (lst[i] for i in rng)
+        if after is not None:
+            lo = bisect.bisect_right(lst, after)
+        return (lst[i] for i in range(lo, hi))
+
+    def query(
+        self,
+        sort: SortOption = "newest",
+        category: Optional[str] = None,
+        career: Optional[str] = None,
+        careers: Optional[List[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        q: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        order = _order_for(sort)
+        after = decode_cursor(sort, cursor)
+        if career:
+            parts = [(category, career)]
+        elif careers:
+            parts = [(category, c) for c in dict.fromkeys(careers)]
+        else:
+            parts = [(category, None)]
+        needle = q.lower() if q else None
+        price_in_scan = order != "price" and (min_price is not None or max_price is not None)
+
+        with self._lock:
+            streams = [
+                self._iter_partition(self._lists.get((cat, car, order), []), sort, after, min_price, max_price)
+                for cat, car in parts
+            ]
+            merged = heapq.merge(*streams, reverse=sort == "price_desc") if len(streams) > 1 else streams[0]
+
+            def _matches(key: Key) -> bool:
+                p = self.products[key[1]]
+                if price_in_scan:
+                    price = float(p.get("price") or 0.0)
+                    if (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                        return False
+                if needle:
+                    text = f"{p.get('name','')} {p.get('description','')}".lower()
+                    if needle not in text:
+                        return False
+                return True
+
+            keys = list(islice((k for k in merged if _matches(k)), limit + 1))
+            items = [dict(self.products[k[1]]) for k in keys[:limit]]
+
+        next_cursor = encode_cursor(sort, keys[limit - 1]) if len(keys) > limit else None
+        return items, next_cursor
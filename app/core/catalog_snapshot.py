@@ -0,0 +1,328 @@
+# app/core/catalog_snapshot.py
+"""
+Snapshot columnar del catálogo en un archivo mapeado en memoria, compartido por
+todos los workers de uvicorn.
+
+Un solo proceso (el que obtiene el lock del archivo) construye el snapshot a partir
+de `products` y lo publica de forma atómica (escribe a un temporal y hace rename).
+Tras la primera construcción, los cambios del índice de versiones se aplican sobre las
+filas ya publicadas releyendo solo los productos afectados.
+Todos los workers lo mapean en solo lectura: el page cache del SO guarda UNA copia
+para todos, y las búsquedas por ID son búsquedas binarias sobre el mmap.
+
+Formato (little endian, secciones alineadas a 8 bytes):
+    header       magic, versión (µs de construcción), n_rows, n_strings, posiciones
+    str_offsets  (n_strings + 1) x u64      -> offsets dentro de str_blob
+    str_blob     UTF-8 concatenado          (tabla de strings deduplicada)
+    str_cols     len(_STR_COLS) x n_rows x u32   (ids de string; columna por columna;
+                 las listas, p.ej. `images`, se guardan unidas por "\n")
+    price        n_rows x f64
+    int_cols     len(_INT_COLS) x n_rows x i64   (stock, createdAt/updatedAt en µs UTC)
+Las filas están ordenadas por ID de documento (orden de bytes UTF-8).
+Solo se guardan los campos de `ProductOut`. La columna `stock` es el valor legado del
+documento del producto: el stock vigente vive en `inventory` y los lectores siempre lo
+superponen (`inventory_repo.merge_stock`), porque sus cambios no versionan el snapshot.
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"UCBCAT02"
+_HEADER = struct.Struct("<8sqIIQQQQQ")
+_NULL = 0xFFFFFFFF
+_STR_COLS = ("id", "name", "description", "category", "career", "image", "createdBy", "images")
+_LIST_COLS = ("images",)
+_INT_COLS = ("stock", "createdAt", "updatedAt")
+_TS_COLS = ("createdAt", "updatedAt")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_INT_NULL = -(2 ** 63)
+
+
+def to_micros(value: Any) -> Optional[int]:
+    """datetime → µs desde epoch (naive se asume UTC, como `_now()` de los repos)."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(value: int) -> Optional[datetime]:
+    if value == _INT_NULL:
+        return None
+    return datetime.fromtimestamp(value / 1_000_000, tz=timezone.utc)
+
+
+def _pad(buf: bytearray) -> None:
+    buf.extend(b"\0" * (-len(buf) % 8))
+
+
+def write_snapshot(path: str, products: Iterable[Dict[str, Any]]) -> int:
+    """Construye el snapshot y lo publica atómicamente en `path`. Devuelve la versión."""
+    rows = sorted(products, key=lambda p: p["id"].encode("utf-8"))
+    n = len(rows)
+    strings: Dict[str, int] = {}
+    str_cols = [[_NULL] * n for _ in _STR_COLS]
+    for r, product in enumerate(rows):
+        for c, field in enumerate(_STR_COLS):
+            value = product.get(field)
+            if field in _LIST_COLS:
+                value = "\n".join(value) if value else None
+            if value is not None:
+                str_cols[c][r] = strings.setdefault(str(value), len(strings))
+
+    blob = bytearray()
+    offsets = [0]
+    for s in strings:  # dict conserva el orden de inserción = id de string
+        blob.extend(s.encode("utf-8"))
+        offsets.append(len(blob))
+
+    version = to_micros(datetime.now(timezone.utc))
+    body = bytearray(b"\0" * _HEADER.size)
+    _pad(body)
+    off_pos = len(body)
+    body.extend(struct.pack(f"<{len(offsets)}Q", *offsets))
+    blob_pos = len(body)
+    body.extend(blob)
+    _pad(body)
+    str_pos = len(body)
+    for col in str_cols:
+        body.extend(struct.pack(f"<{n}I", *col))
+    _pad(body)
+    price_pos = len(body)
+    body.extend(struct.pack(f"<{n}d", *(float(p.get("price") or 0.0) for p in rows)))
+    int_pos = len(body)
+    for field in _INT_COLS:
+        if field in _TS_COLS:
+            values = [to_micros(p.get(field)) for p in rows]
+            values = [_INT_NULL if v is None else v for v in values]
+        else:
+            values = [int(p.get(field) or 0) for p in rows]
+        body.extend(struct.pack(f"<{n}q", *values))
+    _HEADER.pack_into(body, 0, _MAGIC, version, n, len(strings), off_pos, blob_pos, str_pos, price_pos, int_pos)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)  # swap atómico: los lectores ven el viejo o el nuevo, nunca uno a medias
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return version
+
+
+class CatalogSnapshot:
+    """Vista de solo lectura sobre un snapshot mapeado en memoria."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (st.st_ino, st.st_mtime_ns)
+        mv = memoryview(self._mm)
+        magic, self.version, n, n_strings, off_pos, blob_pos, str_pos, price_pos, int_pos = _HEADER.unpack_from(mv, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} no es un snapshot de catálogo")
+        self._n = n
+        self._offsets = mv[off_pos:off_pos + 8 * (n_strings + 1)].cast("Q")
+        self._blob = mv[blob_pos:blob_pos + self._offsets[n_strings]] if n_strings else mv[0:0]
+        self._str = mv[str_pos:str_pos + 4 * n * len(_STR_COLS)].cast("I")
+        self._price = mv[price_pos:price_pos + 8 * n].cast("d")
+        self._ints = mv[int_pos:int_pos + 8 * n * len(_INT_COLS)].cast("q")
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _string_bytes(self, sid: int) -> bytes:
+        return bytes(self._blob[self._offsets[sid]:self._offsets[sid + 1]])
+
+    def _string(self, col: int, row: int) -> Optional[str]:
+        sid = self._str[col * self._n + row]
+        if sid == _NULL:
+            return None
+        return str(self._blob[self._offsets[sid]:self._offsets[sid + 1]], "utf-8")
+
+    def _find(self, prod_id: str) -> int:
+        key = prod_id.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string_bytes(self._str[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._string_bytes(self._str[lo]) == key:
+            return lo
+        return -1
+
+    def row(self, r: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for c, field in enumerate(_STR_COLS):
+            value = self._string(c, r)
+            if field in _LIST_COLS:
+                value = value.split("\n") if value else []
+            out[field] = value
+        out["price"] = self._price[r]
+        for c, field in enumerate(_INT_COLS):
+            value = self._ints[c * self._n + r]
+            out[field] = _from_micros(value) if field in _TS_COLS else value
+        return out
+
+    def get(self, prod_id: str) -> Optional[Dict[str, Any]]:
+        r = self._find(prod_id)
+        return self.row(r) if r >= 0 else None
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for r in range(self._n):
+            yield self.row(r)
+
+
+class _SnapshotManager:
+    """Mantiene el snapshot vigente del proceso y, si este proceso es el líder, lo reconstruye."""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._check_interval = 1.0
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """Snapshot mapeado; cada `check_interval` s revisa si el archivo fue reemplazado."""
+        if not self.path:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at < self._check_interval:
+            return self._snapshot
+        with self._lock:
+            if now - self._checked_at >= self._check_interval:
+                self._checked_at = now
+                try:
+                    st = os.stat(self.path)
+                    if self._snapshot is None or self._snapshot.file_id != (st.st_ino, st.st_mtime_ns):
+                        # no cerramos el mmap anterior: puede haber lecturas en curso; el GC lo libera
+                        self._snapshot = CatalogSnapshot(self.path)
+                except FileNotFoundError:
+                    self._snapshot = None
+                except Exception:
+                    logger.exception("No se pudo abrir el snapshot de catálogo %s", self.path)
+        return self._snapshot
+
+    def _try_become_builder(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:  # sin flock (Windows): cada proceso construye el suyo
+            self._lock_file = True
+            return True
+        f = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f  # el lock dura lo que viva el proceso
+        return True
+
+    def _patched_rows(
+        self,
+        last_probe: Dict[str, Any],
+        probe: Dict[str, Any],
+        fetch_rows: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+    ) -> Iterator[Dict[str, Any]]:
+        """Filas del snapshot publicado + solo los productos cuya versión cambió desde `last_probe`."""
+        changed = [pid for pid, v in probe.items() if last_probe.get(pid) != v]
+        gone = set(last_probe).difference(probe)
+        fresh = fetch_rows(changed) if changed else {}
+        gone.update(pid for pid in changed if pid not in fresh)
+        # leemos el archivo directamente: `current()` puede tener aún el mmap anterior
+        for row in CatalogSnapshot(self.path).iter_rows():
+            if row["id"] not in gone and row["id"] not in fresh:
+                yield row
+        yield from fresh.values()
+
+    def _builder_loop(
+        self,
+        load_rows: Callable[[], Iterable[Dict[str, Any]]],
+        fetch_rows: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        version_probe: Callable[[], Any],
+        refresh_seconds: float,
+    ) -> None:
+        last_probe: Optional[Dict[str, Any]] = None
+        while not self._stop.is_set():
+            try:
+                if self._try_become_builder():
+                    probe = dict(version_probe())
+                    if last_probe is None or not os.path.exists(self.path):
+                        # primera construcción de este builder: scan completo
+                        version = write_snapshot(self.path, load_rows())
+                    elif probe != last_probe:
+                        version = write_snapshot(self.path, self._patched_rows(last_probe, probe, fetch_rows))
+                    else:
+                        version = None
+                    if version is not None:
+                        last_probe = probe
+                        logger.info("Snapshot de catálogo publicado (versión %s)", version)
+            except Exception:
+                logger.exception("Fallo construyendo el snapshot de catálogo")
+            self._stop.wait(refresh_seconds)
+
+    def start(
+        self,
+        path: str,
+        load_rows: Callable[[], Iterable[Dict[str, Any]]],
+        fetch_rows: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        version_probe: Callable[[], Any],
+        refresh_seconds: float = 10.0,
+        check_seconds: float = 1.0,
+    ) -> None:
+        """
+        Activa el snapshot en este proceso. `load_rows` recorre el catálogo completo (solo
+        para la primera construcción), `fetch_rows(ids)` trae esos productos ({id: fila}, los
+        que no existen se omiten) y `version_probe` devuelve {id: versión}; las siguientes
+        reconstrucciones parten del snapshot publicado y solo releen los IDs cuya versión cambió.
+        """
+        self.path = path
+        self._check_interval = check_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._builder_loop,
+            args=(load_rows, fetch_rows, version_probe, refresh_seconds),
+            name="catalog-snapshot",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detiene el builder (al apagar) y suelta el lock para que otro worker tome el relevo."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._lock_file not in (None, True):
+            self._lock_file.close()
+        self._lock_file = None
+
+
+manager = _SnapshotManager()
@@ -1,7 +1,17 @@
-import firebase_admin
-from firebase_admin import credentials, auth, firestore as admin_fs
+# app/core/firebase.py
+"""
+Clientes de Firebase (Admin, Auth, Firestore) creados de forma perezosa.
+
+Importar este módulo no inicializa nada ni importa el SDK de Firebase: `firestore_db`
+y `firebase_auth` son proxies que crean el cliente real en el primer uso (o cuando
+el lifespan de la app llama a `warm_up`). Así el cold start no paga ese costo.
+"""
+import threading
+from typing import Any, Callable
 
 from app.config import (
+    DATA_BACKEND,
+    MEMORY_BACKEND_LATENCY_MS,
     FIREBASE_TYPE,
     FIREBASE_PROJECT_ID,
     FIREBASE_PRIVATE_KEY_ID,
@@ -15,28 +25,100 @@ from app.config import (
     FIREBASE_UNIVERSE_DOMAIN,
 )
 
-# Si tu entorno envuelve el PEM con comillas, puedes sanearlo:
-# _PRIVATE_KEY = FIREBASE_PRIVATE_KEY.strip('"').strip("'")
-_PRIVATE_KEY = FIREBASE_PRIVATE_KEY
-
-cred_payload = {
-    "type": FIREBASE_TYPE,
-    "project_id": FIREBASE_PROJECT_ID,
-    "private_key_id": FIREBASE_PRIVATE_KEY_ID,
-    "private_key": _PRIVATE_KEY,
-    "client_email": FIREBASE_CLIENT_EMAIL,
-    "client_id": FIREBASE_CLIENT_ID,
-    "auth_uri": FIREBASE_AUTH_URI,
-    "token_uri": FIREBASE_TOKEN_URI,
-    "auth_provider_x509_cert_url": FIREBASE_AUTH_PROVIDER_X509_CERT_URL,
-    "client_x509_cert_url": FIREBASE_CLIENT_X509_CERT_URL,
-    "universe_domain": FIREBASE_UNIVERSE_DOMAIN,
-}
-
-# Inicializa Firebase Admin con el dict (sin archivo JSON)
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(credentials.Certificate(cred_payload))
-
-# Clientes globales
-firebase_auth = auth
-firestore_db = admin_fs.client()  # ✅ usa las credenciales del admin app
+
+class _LazyClient:
+    """Proxy thread-safe que construye el objeto real en el primer acceso a un atributo."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._resolve(), name, value)
+
+
+def _init_admin_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Si tu entorno envuelve el PEM con comillas, puedes sanearlo:
+    # _PRIVATE_KEY = FIREBASE_PRIVATE_KEY.strip('"').strip("'")
+    _PRIVATE_KEY = FIREBASE_PRIVATE_KEY
+
+    cred_payload = {
+        "type": FIREBASE_TYPE,
+        "project_id": FIREBASE_PROJECT_ID,
+        "private_key_id": FIREBASE_PRIVATE_KEY_ID,
+        "private_key": _PRIVATE_KEY,
+        "client_email": FIREBASE_CLIENT_EMAIL,
+        "client_id": FIREBASE_CLIENT_ID,
+        "auth_uri": FIREBASE_AUTH_URI,
+        "token_uri": FIREBASE_TOKEN_URI,
+        "auth_provider_x509_cert_url": FIREBASE_AUTH_PROVIDER_X509_CERT_URL,
+        "client_x509_cert_url": FIREBASE_CLIENT_X509_CERT_URL,
+        "universe_domain": FIREBASE_UNIVERSE_DOMAIN,
+    }
+
+    # Inicializa Firebase Admin con el dict (sin archivo JSON)
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(cred_payload))
+
+
+_admin_lock = threading.Lock()
+
+
+def _ensure_admin_app() -> None:
+    with _admin_lock:
+        _init_admin_app()
+
+
+def _create_firestore():
+    if DATA_BACKEND == "memory":
+        # Backend en memoria: sin credenciales, para desarrollo y benchmarks
+        from app.core.memory_backend import MemoryFirestore
+
+        return MemoryFirestore(latency=MEMORY_BACKEND_LATENCY_MS / 1000.0)
+    _ensure_admin_app()
+    from firebase_admin import firestore as admin_fs
+
+    return admin_fs.client()  # ✅ usa las credenciales del admin app
+
+
+def _create_auth():
+    if DATA_BACKEND == "memory":
+        from app.core.memory_backend import MemoryAuth
+
+        return MemoryAuth()
+    _ensure_admin_app()
+    from firebase_admin import auth
+
+    return auth
+
+
+# Clientes globales (perezosos)
+firestore_db = _LazyClient(_create_firestore)
+firebase_auth = _LazyClient(_create_auth)
+
+
+def warm_up() -> None:
+    """Fuerza la creación de los clientes (p.ej. desde el lifespan, fuera del camino crítico)."""
+    firestore_db._resolve()
+    firebase_auth._resolve()
@@ -0,0 +1,555 @@
+# app/core/memory_backend.py
+"""
+Backend en memoria que imita el subconjunto de la API de Firestore / Firebase Auth
+que usan `products_repo`, `cart_repo` y `deps`.
+
+Se activa con DATA_BACKEND=memory y sirve para correr el servicio (y los benchmarks)
+sin credenciales reales. MEMORY_BACKEND_LATENCY_MS inyecta una latencia fija por RPC
+para simular el round-trip a Firestore.
+"""
+import copy
+import random
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def _is_delete_field(value: Any) -> bool:
+    # Import diferido: el SDK de Firestore solo se carga si alguien usa sus sentinelas
+    if type(value).__name__ != "Sentinel":
+        return False
+    from google.cloud.firestore_v1.transforms import DELETE_FIELD
+
+    return value is DELETE_FIELD
+
+
+def _failed_precondition(message: str) -> Exception:
+    # misma excepción que lanza el SDK real, para que los repos la manejen igual
+    try:
+        from google.api_core.exceptions import FailedPrecondition
+    except ImportError:  # pragma: no cover - el SDK es dependencia del servicio
+        return RuntimeError(message)
+    return FailedPrecondition(message)
+
+
+class MemoryWriteOption:
+    """Precondición de escritura (como `Client.write_option(last_update_time=...|exists=...)`)."""
+
+    def __init__(self, last_update_time=None, exists: Optional[bool] = None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+    def check(self, current: Optional[Tuple[Dict[str, Any], Any]], path: str) -> None:
+        if self.exists is not None and (current is not None) != self.exists:
+            raise _failed_precondition(f"{path}: exists={current is not None}")
+        if self.last_update_time is not None and (current is None or current[1] != self.last_update_time):
+            raise _failed_precondition(f"{path}: el documento cambió desde {self.last_update_time}")
+
+
+def _already_exists(message: str) -> Exception:
+    try:
+        from google.api_core.exceptions import AlreadyExists
+    except ImportError:  # pragma: no cover
+        return RuntimeError(message)
+    return AlreadyExists(message)
+
+
+class MemoryWriteResult:
+    """Como `WriteResult`: expone el `update_time` que dejó la escritura."""
+
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+def _auto_id() -> str:
+    # Mismo formato que los IDs automáticos de Firestore (20 caracteres alfanuméricos)
+    return "".join(random.choices(_ID_ALPHABET, k=20))
+
+
+def _get_path(data: Dict[str, Any], field_path: str) -> Tuple[bool, Any]:
+    cur: Any = data
+    for part in field_path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return False, None
+        cur = cur[part]
+    return True, cur
+
+
+def _set_path(data: Dict[str, Any], field_path: str, value: Any) -> None:
+    parts = field_path.split(".")
+    cur = data
+    for part in parts[:-1]:
+        nxt = cur.get(part)
+        if not isinstance(nxt, dict):
+            nxt = {}
+            cur[part] = nxt
+        cur = nxt
+    if _is_delete_field(value):
+        cur.pop(parts[-1], None)
+    else:
+        cur[parts[-1]] = value
+
+
+def _deep_merge(target: Dict[str, Any], source: Dict[str, Any]) -> None:
+    for k, v in source.items():
+        if _is_delete_field(v):
+            target.pop(k, None)
+        elif isinstance(v, dict):
+            if not isinstance(target.get(k), dict):
+                target[k] = {}
+            _deep_merge(target[k], v)
+        else:
+            target[k] = copy.deepcopy(v)
+
+
+def _match(op: str, left: Any, right: Any) -> bool:
+    try:
+        if op == "==":
+            return left == right
+        if op == "!=":
+            return left != right
+        if op == "<":
+            return left < right
+        if op == "<=":
+            return left <= right
+        if op == ">":
+            return left > right
+        if op == ">=":
+            return left >= right
+        if op == "in":
+            return left in right
+        if op == "not-in":
+            return left not in right
+        if op == "array_contains":
+            return isinstance(left, list) and right in left
+        if op == "array_contains_any":
+            return isinstance(left, list) and any(r in left for r in right)
+    except TypeError:
+        return False
+    raise ValueError(f"Operador no soportado por el backend en memoria: {op}")
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]], update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        found, value = _get_path(self._data or {}, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryFirestore", collection: str, doc_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    def get(self) -> MemoryDocumentSnapshot:
+        self._client._rpc()
+        return self._client._snapshot(self._collection, self.id)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> MemoryWriteResult:
+        self._client._rpc()
+        return MemoryWriteResult(self._apply_set(document_data, merge))
+
+    def create(self, document_data: Dict[str, Any]) -> MemoryWriteResult:
+        """Falla con AlreadyExists si el documento ya existe (como `DocumentReference.create`)."""
+        self._client._rpc()
+        with self._client._lock:
+            if self.id in self._client._collection_data(self._collection):
+                raise _already_exists(f"{self.path} ya existe")
+            return MemoryWriteResult(self._apply_set(document_data))
+
+    def update(self, field_updates: Dict[str, Any], option: Optional[MemoryWriteOption] = None) -> MemoryWriteResult:
+        self._client._rpc()
+        with self._client._lock:
+            self._check(option)
+            return MemoryWriteResult(self._apply_update(field_updates))
+
+    def delete(self, option: Optional[MemoryWriteOption] = None) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            self._check(option)
+            self._apply_delete()
+
+    def _check(self, option: Optional[MemoryWriteOption]) -> None:
+        if option is not None:
+            option.check(self._client._collection_data(self._collection).get(self.id), self.path)
+
+    def _apply_set(self, document_data: Dict[str, Any], merge: bool = False):
+        with self._client._lock:
+            docs = self._client._collection_data(self._collection)
+            if merge and self.id in docs:
+                _deep_merge(docs[self.id][0], document_data)
+            else:
+                fresh: Dict[str, Any] = {}
+                _deep_merge(fresh, document_data)
+                docs[self.id] = (fresh, None)
+            docs[self.id] = (docs[self.id][0], self._client._tick())
+            return docs[self.id][1]
+
+    def _apply_update(self, field_updates: Dict[str, Any]):
+        with self._client._lock:
+            docs = self._client._collection_data(self._collection)
+            if self.id not in docs:
+                raise KeyError(f"No existe el documento {self.path}")
+            data = docs[self.id][0]
+            for field_path, value in field_updates.items():
+                _set_path(data, field_path, copy.deepcopy(value))
+            docs[self.id] = (data, self._client._tick())
+            return docs[self.id][1]
+
+    def _apply_delete(self) -> None:
+        with self._client._lock:
+            self._client._collection_data(self._collection).pop(self.id, None)
+
+
+class MemoryWriteBatch:
+    """Escrituras agrupadas: se aplican juntas (atómicamente) en un solo RPC al hacer commit."""
+
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._ops: List[Tuple[str, MemoryDocumentReference, Any, bool, Any]] = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._ops.append(("set", reference, copy.deepcopy(document_data), merge, None))
+        return self
+
+    def create(self, reference: MemoryDocumentReference, document_data: Dict[str, Any]):
+        self._ops.append(("create", reference, copy.deepcopy(document_data), False, None))
+        return self
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any], option=None):
+        self._ops.append(("update", reference, copy.deepcopy(field_updates), False, option))
+        return self
+
+    def delete(self, reference: MemoryDocumentReference, option=None):
+        self._ops.append(("delete", reference, None, False, option))
+        return self
+
+    def commit(self) -> None:
+        self._client._rpc()
+        with self._client._lock:
+            # validamos antes de aplicar para que el batch sea todo o nada
+            for kind, ref, _, _, option in self._ops:
+                if kind == "update" and ref.id not in self._client._collection_data(ref._collection):
+                    raise KeyError(f"No existe el documento {ref.path}")
+                if kind == "create" and ref.id in self._client._collection_data(ref._collection):
+                    raise _already_exists(f"{ref.path} ya existe")
+                ref._check(option)
+            for kind, ref, data, merge, _ in self._ops:
+                if kind in ("set", "create"):
+                    ref._apply_set(data, merge)
+                elif kind == "update":
+                    ref._apply_update(data)
+                else:
+                    ref._apply_delete()
+        self._ops = []
+
+
+class MemoryBulkWriterOperation:
+    def __init__(self, kind: str, reference: "MemoryDocumentReference", option=None):
+        self.kind = kind
+        self.reference = reference
+        self.option = option
+
+
+class MemoryBulkWriteFailure:
+    def __init__(self, operation: MemoryBulkWriterOperation, code: int, message: str):
+        self.operation = operation
+        self.code = code
+        self.message = message
+        self.attempts = 1
+
+
+class MemoryBulkWriter:
+    """
+    Como `Client.bulk_writer()`: encola escrituras independientes (NO atómicas) y las envía
+    en lotes de `_BATCH` por RPC. Los fallos individuales van al callback `on_write_error`.
+    """
+
+    _BATCH = 20
+
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._ops: List[Tuple[str, MemoryDocumentReference, Any, Any]] = []
+        self._on_error = None
+        self._on_result = None
+
+    def on_write_error(self, callback) -> None:
+        self._on_error = callback
+
+    def on_write_result(self, callback) -> None:
+        self._on_result = callback
+
+    def set(self, reference, document_data: Dict[str, Any], merge: bool = False, attempts: int = 0) -> None:
+        self._enqueue(("set", reference, (copy.deepcopy(document_data), merge), None))
+
+    def update(self, reference, field_updates: Dict[str, Any], option=None, attempts: int = 0) -> None:
+        self._enqueue(("update", reference, copy.deepcopy(field_updates), option))
+
+    def delete(self, reference, option=None, attempts: int = 0) -> None:
+        self._enqueue(("delete", reference, None, option))
+
+    def _enqueue(self, op) -> None:
+        self._ops.append(op)
+        if len(self._ops) >= self._BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        while self._ops:
+            chunk, self._ops = self._ops[:self._BATCH], self._ops[self._BATCH:]
+            self._client._rpc()
+            for kind, ref, data, option in chunk:
+                try:
+                    with self._client._lock:
+                        ref._check(option)
+                        if kind == "set":
+                            ref._apply_set(*data)
+                        elif kind == "update":
+                            ref._apply_update(data)
+                        else:
+                            ref._apply_delete()
+                except Exception as e:
+                    code = 9 if type(e).__name__ == "FailedPrecondition" else 5 if isinstance(e, KeyError) else 13
+                    if self._on_error is not None:
+                        self._on_error(MemoryBulkWriteFailure(MemoryBulkWriterOperation(kind, ref, option), code, str(e)), self)
+                    continue
+                if self._on_result is not None:
+                    self._on_result(ref, None, self)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class MemoryQuery:
+    def __init__(
+        self,
+        client: "MemoryFirestore",
+        collection: str,
+        filters: Tuple[Any, ...] = (),
+        orders: Tuple[Tuple[str, str], ...] = (),
+        limit_count: Optional[int] = None,
+        cursor: Optional[Dict[str, Any]] = None,
+    ):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **overrides) -> "MemoryQuery":
+        attrs = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit_count": self._limit,
+            "cursor": self._cursor,
+        }
+        attrs.update(overrides)
+        return MemoryQuery(self._client, self._collection, **attrs)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter=None):
+        if filter is None:
+            from google.cloud.firestore_v1.base_query import FieldFilter
+
+            filter = FieldFilter(field_path, op_string, value)
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING"):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy(limit_count=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        if isinstance(document_fields_or_snapshot, MemoryDocumentSnapshot):
+            cursor = document_fields_or_snapshot.to_dict() or {}
+        else:
+            cursor = dict(document_fields_or_snapshot)
+        return self._copy(cursor=cursor)
+
+    def _passes(self, doc_id: str, data: Dict[str, Any], flt) -> bool:
+        if hasattr(flt, "filters"):  # Or / And
+            results = (self._passes(doc_id, data, f) for f in flt.filters)
+            return any(results) if getattr(flt.operator, "name", "") == "OR" else all(results)
+        found, value = self._field(doc_id, data, flt.field_path)
+        right = flt.value
+        if flt.field_path == "__name__":
+            # en Firestore el valor es una referencia de documento (o lista de ellas)
+            right = [getattr(r, "id", r) for r in right] if isinstance(right, list) else getattr(right, "id", right)
+        return found and _match(flt.op_string, value, right)
+
+    @staticmethod
+    def _field(doc_id: str, data: Dict[str, Any], field: str) -> Tuple[bool, Any]:
+        # "__name__" ordena/filtra por el ID del documento, igual que en Firestore
+        if field == "__name__":
+            return True, doc_id
+        return _get_path(data, field)
+
+    def _after_cursor(self, doc_id: str, data: Dict[str, Any]) -> bool:
+        for field, direction in self._orders:
+            if field not in self._cursor:
+                return True
+            _, value = self._field(doc_id, data, field)
+            ref = self._cursor[field]
+            if value == ref:
+                continue
+            return value < ref if direction == "DESCENDING" else value > ref
+        return False
+
+    def stream(self) -> Iterator[MemoryDocumentSnapshot]:
+        self._client._rpc()
+        with self._client._lock:
+            rows = [
+                (doc_id, copy.deepcopy(data), ts)
+                for doc_id, (data, ts) in self._client._collection_data(self._collection).items()
+            ]
+        rows = [r for r in rows if all(self._passes(r[0], r[1], f) for f in self._filters)]
+        # Firestore excluye documentos que no tienen el campo de ordenamiento
+        rows = [r for r in rows if all(self._field(r[0], r[1], f)[0] for f, _ in self._orders)]
+        rows.sort(key=lambda r: r[0])
+        for field, direction in reversed(self._orders):
+            rows.sort(key=lambda r: self._field(r[0], r[1], field)[1], reverse=direction == "DESCENDING")
+        if self._cursor is not None:
+            rows = [r for r in rows if self._after_cursor(r[0], r[1])]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        for doc_id, data, ts in rows:
+            ref = MemoryDocumentReference(self._client, self._collection, doc_id)
+            yield MemoryDocumentSnapshot(ref, data, ts)
+
+    def get(self) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self, alias or "count")
+
+
+class MemoryAggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+
+class MemoryAggregationQuery:
+    """Agregación `count()`: devuelve [[resultado]] como el SDK."""
+
+    def __init__(self, query: MemoryQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self) -> List[List[MemoryAggregationResult]]:
+        return [[MemoryAggregationResult(self._alias, sum(1 for _ in self._query.stream()))]]
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryFirestore", name: str):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection, document_id or _auto_id())
+
+
+class MemoryFirestore:
+    """Cliente Firestore en memoria, thread-safe, con latencia inyectable por RPC."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.rpc_count = 0
+        self._lock = threading.RLock()
+        self._data: Dict[str, Dict[str, Tuple[Dict[str, Any], Any]]] = {}
+        self._last_tick: Optional[datetime] = None
+
+    def _rpc(self) -> None:
+        with self._lock:
+            self.rpc_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _tick(self) -> datetime:
+        # estrictamente creciente: dos escrituras nunca comparten update_time (precondiciones)
+        now = datetime.now(timezone.utc)
+        if self._last_tick is not None and now <= self._last_tick:
+            now = self._last_tick + timedelta(microseconds=1)
+        self._last_tick = now
+        return now
+
+    def _collection_data(self, name: str) -> Dict[str, Tuple[Dict[str, Any], Any]]:
+        return self._data.setdefault(name, {})
+
+    def _snapshot(self, collection: str, doc_id: str) -> MemoryDocumentSnapshot:
+        with self._lock:
+            data, ts = self._collection_data(collection).get(doc_id, (None, None))
+            data = copy.deepcopy(data)
+        return MemoryDocumentSnapshot(MemoryDocumentReference(self, collection, doc_id), data, ts)
+
+    def collection(self, name: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, name)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def bulk_writer(self) -> MemoryBulkWriter:
+        return MemoryBulkWriter(self)
+
+    @staticmethod
+    def write_option(**kwargs) -> MemoryWriteOption:
+        return MemoryWriteOption(**kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None) -> Iterator[MemoryDocumentSnapshot]:
+        """Multi-get: un solo RPC para varios documentos (como `Client.get_all`, incluida la proyección)."""
+        references = list(references)
+        self._rpc()
+        for ref in references:
+            snap = self._snapshot(ref._collection, ref.id)
+            if field_paths is not None and snap.exists:
+                projected = {}
+                for path in field_paths:
+                    found, value = _get_path(snap._data, path)
+                    if found:
+                        _set_path(projected, path, value)
+                snap._data = projected
+            yield snap
+
+    def reset(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.rpc_count = 0
+
+
+class MemoryAuth:
+    """
+    Sustituto de `firebase_admin.auth` para el backend en memoria.
+    El token (o la cookie de sesión) ES el uid: solo para desarrollo y benchmarks.
+    """
+
+    @staticmethod
+    def _decode(token: str) -> Dict[str, Any]:
+        if not token:
+            raise ValueError("Token vacío")
+        return {"uid": token, "email": f"{token}@memory.local", "name": token}
+
+    def verify_id_token(self, token: str, **_kwargs) -> Dict[str, Any]:
+        return self._decode(token)
+
+    def verify_session_cookie(self, cookie: str, **_kwargs) -> Dict[str, Any]:
+        return self._decode(cookie)
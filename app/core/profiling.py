@@ -0,0 +1,286 @@
+# app/core/profiling.py
+"""
+Herramientas de diagnóstico bajo demanda (solo para administradores).
+
+- `sample_stacks`: muestreador estadístico de TODOS los hilos durante una ventana
+  acotada; devuelve stacks colapsados (`raíz;...;hoja N`) listos para flamegraph.pl
+  o speedscope. Mientras no se pide un perfil no hay ningún hilo ni hook activo.
+- `recorder`: guarda las N peticiones más lentas con el desglose por fase
+  (auth, permissions, repository, serialization, other). Desactivado, el middleware
+  solo lee un booleano y `phase()` devuelve un contexto vacío compartido.
+"""
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+PHASES = ("auth", "permissions", "repository", "serialization")
+# hojas típicas de un hilo bloqueado esperando trabajo (workers del threadpool, loop en select)
+_IDLE_MODULES = ("threading", "selectors", "queue", "concurrent.futures.thread")
+
+
+# --------------------------------------------------------------------------- sampler
+
+class ProfilerBusy(Exception):
+    """Ya hay un muestreo en curso en este proceso."""
+
+
+_sampling = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+def _collapse(frame, thread_name: str) -> Optional[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    if not labels:
+        return None
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_globals.get("__name__") in _IDLE_MODULES
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, include_idle: bool = False) -> Dict[str, Any]:
+    """
+    Muestrea `sys._current_frames()` cada `interval` s durante `seconds` s (bloqueante:
+    llamar desde un hilo propio). Devuelve {"samples", "duration_s", "stacks": {stack: n}}.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not include_idle and _is_idle(frame)):
+                    continue
+                stack = _collapse(frame, names.get(ident, f"thread-{ident}"))
+                if stack:
+                    counts[stack] += 1
+            samples += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(interval, deadline - now))
+        return {"samples": samples, "duration_s": round(time.perf_counter() - start, 3), "stacks": dict(counts)}
+    finally:
+        _sampling.release()
+
+
+async def sample_stacks_async(seconds: float, interval: float = 0.01, include_idle: bool = False) -> Dict[str, Any]:
+    """Corre el muestreo en un hilo dedicado (no ocupa el threadpool ni bloquea el loop)."""
+    import asyncio
+    from concurrent.futures import Future
+
+    fut: Future = Future()
+
+    def _run():
+        try:
+            fut.set_result(sample_stacks(seconds, interval, include_idle))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=_run, name="stack-sampler", daemon=True).start()
+    return await asyncio.wrap_future(fut)
+
+
+def to_collapsed_text(stacks: Dict[str, int]) -> str:
+    lines = [f"{stack} {n}" for stack, n in sorted(stacks.items(), key=lambda kv: -kv[1])]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+# --------------------------------------------------------------------------- slow requests
+
+class _Trace:
+    """Tiempos de una petición; las fases anidadas se descuentan de la fase que las contiene."""
+
+    __slots__ = ("start", "phases", "_stack", "handler_end")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self._stack: List[List[Any]] = []  # [nombre, inicio, tiempo de hijas]
+        self.handler_end: Optional[float] = None
+
+    def enter(self, name: str) -> None:
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self) -> None:
+        name, started, children = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+
+class _Phase:
+    __slots__ = ("_trace", "_name")
+
+    def __init__(self, trace: _Trace, name: str):
+        self._trace, self._name = trace, name
+
+    def __enter__(self):
+        self._trace.enter(self._name)
+
+    def __exit__(self, *exc):
+        self._trace.exit()
+        return False
+
+
+_current: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("request_trace", default=None)
+_NOOP = nullcontext()
+
+
+def phase(name: str):
+    """`with phase("auth"): ...` — mide la fase solo si la petición se está registrando."""
+    trace = _current.get()
+    return _NOOP if trace is None else _Phase(trace, name)
+
+
+class SlowRequestRecorder:
+    """Top-N de peticiones más lentas (min-heap por duración)."""
+
+    def __init__(self, capacity: int = 20, enabled: bool = False):
+        self.enabled = enabled
+        self.capacity = capacity
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, capacity: Optional[int] = None) -> None:
+        with self._lock:
+            if capacity is not None:
+                self.capacity = capacity
+                while len(self._heap) > capacity:
+                    heapq.heappop(self._heap)
+            if enabled is not None:
+                self.enabled = enabled
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap = []
+
+    def add(self, total_ms: float, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            item = (total_ms, next(self._seq), entry)
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif self._heap and total_ms > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = [e for _, _, e in sorted(self._heap, key=lambda it: -it[0])]
+            return {"enabled": self.enabled, "capacity": self.capacity, "requests": entries}
+
+
+recorder = SlowRequestRecorder()
+
+
+class SlowRequestMiddleware:
+    """Middleware ASGI: si el recorder está activo, mide cada petición HTTP."""
+
+    def __init__(self, app, exclude_prefixes: tuple = ()):
+        self.app = app
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if not recorder.enabled or scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes):
+            return await self.app(scope, receive, send)
+
+        trace = _Trace()
+        token = _current.set(trace)
+        state: Dict[str, Any] = {"status": 500, "response_start": None}
+
+        async def _send(message):
+            if message["type"] == "http.response.start" and state["response_start"] is None:
+                state["response_start"] = time.perf_counter()
+                state["status"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _current.reset(token)
+            self._record(scope, trace, state)
+
+    @staticmethod
+    def _record(scope, trace: _Trace, state: Dict[str, Any]) -> None:
+        total = time.perf_counter() - trace.start
+        phases = dict(trace.phases)
+        if trace.handler_end is not None and state["response_start"] is not None:
+            # validación del response_model + jsonable_encoder + render JSON
+            phases["serialization"] = max(0.0, state["response_start"] - trace.handler_end)
+        breakdown = {name: round(phases.get(name, 0.0) * 1000, 3) for name in PHASES}
+        breakdown["other"] = round(max(0.0, total - sum(phases.values())) * 1000, 3)
+        route = scope.get("route")
+        total_ms = round(total * 1000, 3)
+        recorder.add(total_ms, {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "status": state["status"],
+            "total_ms": total_ms,
+            "phases_ms": breakdown,
+            "at": datetime.now(timezone.utc).isoformat(),
+        })
+
+
+def _timed_endpoint(fn: Callable) -> Callable:
+    """El cuerpo del handler cuenta como fase `repository` (menos las fases anidadas)."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def _async(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return await fn(*args, **kwargs)
+            trace.enter("repository")
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                trace.exit()
+                trace.handler_end = time.perf_counter()
+        return _async
+
+    @functools.wraps(fn)
+    def _sync(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return fn(*args, **kwargs)
+        trace.enter("repository")
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace.exit()
+            trace.handler_end = time.perf_counter()
+    return _sync
+
+
+class ProfiledRoute(APIRoute):
+    """`APIRouter(route_class=ProfiledRoute)`: marca el fin del handler para separar la serialización."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
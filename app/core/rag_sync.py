@@ -1,8 +1,7 @@
 import os
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
-from supabase import create_client, Client
 
 load_dotenv()
 
@@ -10,14 +9,34 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-if not (OPENAI_API_KEY and SUPABASE_URL and SUPABASE_KEY):
-    # Si faltan variables, no rompemos la app, pero logueamos advertencia
-    print("WARNING: Faltan variables de entorno para RAG (OPENAI_API_KEY, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY). La sincronización no funcionará.")
-    openai_client = None
-    supabase = None
-else:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Los clientes (y los SDK de OpenAI/Supabase, que son pesados de importar) se crean
+# en el primer uso o en `warm_up`, no al importar el módulo.
+openai_client = None
+supabase = None
+_clients_ready = False
+_clients_lock = threading.Lock()
+
+def _ensure_clients() -> bool:
+    """Crea los clientes de OpenAI y Supabase una sola vez. Devuelve si el RAG está habilitado."""
+    global openai_client, supabase, _clients_ready
+    if _clients_ready:
+        return openai_client is not None and supabase is not None
+    with _clients_lock:
+        if not _clients_ready:
+            if not (OPENAI_API_KEY and SUPABASE_URL and SUPABASE_KEY):
+                # Si faltan variables, no rompemos la app, pero logueamos advertencia
+                print("WARNING: Faltan variables de entorno para RAG (OPENAI_API_KEY, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY). La sincronización no funcionará.")
+            else:
+                from openai import OpenAI
+                from supabase import create_client
+
+                openai_client = OpenAI(api_key=OPENAI_API_KEY)
+                supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+            _clients_ready = True
+    return openai_client is not None and supabase is not None
+
+def warm_up() -> None:
+    _ensure_clients()
 
 def get_product_text_representation(product: Dict[str, Any]) -> str:
     """
@@ -27,7 +46,9 @@ def get_product_text_representation(product: Dict[str, Any]) -> str:
     name = product.get("name", "Sin nombre")
     desc = product.get("description", "") or "Sin descripción"
     price = product.get("price", 0)
-    stock = product.get("stock", 0)
+    # Solo disponibilidad, no el número exacto: así una venta no cambia el texto
+    # (ni obliga a re-embeber) salvo que el producto se agote o vuelva a haber stock.
+    availability = "En stock" if (product.get("stock") or 0) > 0 else "Agotado"
     category = product.get("category", "General")
     career = product.get("career", "General")
     
@@ -38,12 +59,19 @@ def get_product_text_representation(product: Dict[str, Any]) -> str:
         f"Categoría: {category}\n"
         f"Carrera: {career}\n"
         f"Precio: {price} Bs.\n"
-        f"Stock disponible: {stock}\n"
+        f"Disponibilidad: {availability}\n"
         f"Descripción: {desc}"
     )
     return text
 
+def needs_rag_sync(before: Optional[Dict[str, Any]], after: Dict[str, Any]) -> bool:
+    """True si el texto indexado del producto cambia (p.ej. un cambio de stock normalmente no)."""
+    if not before:
+        return True
+    return get_product_text_representation(before) != get_product_text_representation(after)
+
 def embed_text(text: str) -> List[float]:
+    _ensure_clients()
     if not openai_client:
         return []
     try:
@@ -74,7 +102,7 @@ def sync_product_to_rag(product_data: Dict[str, Any]):
     Sincroniza un producto (creación/edición) con la tabla RAG.
     Estrategia: Borrar chunks anteriores de este producto e insertar uno nuevo.
     """
-    if not supabase or not openai_client:
+    if not _ensure_clients():
         return
 
     raw_id = product_data.get("id")
@@ -115,6 +143,7 @@ def delete_product_from_rag(product_id: str):
     """
     Elimina los chunks de un producto del RAG.
     """
+    _ensure_clients()
     if not supabase:
         return
 
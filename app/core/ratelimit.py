@@ -0,0 +1,126 @@
+# app/core/ratelimit.py
+"""
+Primitivas de admisión: token bucket (rate limit) y limitador de concurrencia con cola.
+
+El estado del rate limit vive detrás de `RateLimitStore`; por defecto en memoria del
+proceso. Para compartir límites entre workers/instancias basta registrar otra
+implementación (p.ej. sobre Redis) con `set_rate_limit_store`.
+"""
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+
+class RateLimitStore(ABC):
+    """Interfaz de almacenamiento de buckets."""
+
+    @abstractmethod
+    def consume(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        """
+        Intenta consumir `cost` tokens del bucket `key` (recarga `rate` tokens/seg, capacidad `burst`).
+        Devuelve 0 si se admitió, o los segundos a esperar antes de reintentar.
+        """
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    def __init__(self, max_keys: int = 100_000):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, last_refill)
+        self._max_keys = max_keys
+
+    def consume(self, key: str, rate: float, burst: int, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                retry_after = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (cost - tokens) / rate if rate > 0 else float("inf")
+            if len(self._buckets) > self._max_keys:
+                self._evict_full(now, rate, burst)
+        return retry_after
+
+    def _evict_full(self, now: float, rate: float, burst: int) -> None:
+        # un bucket que ya se habría rellenado por completo equivale a uno inexistente
+        for k, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * rate >= burst:
+                del self._buckets[k]
+
+
+_store: RateLimitStore = InMemoryRateLimitStore()
+
+
+def get_rate_limit_store() -> RateLimitStore:
+    return _store
+
+
+def set_rate_limit_store(store: RateLimitStore) -> None:
+    global _store
+    _store = store
+
+
+class Overloaded(Exception):
+    """No hay cupo de concurrencia (cola llena o espera agotada)."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("overloaded")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Semáforo con cola acotada: como mucho `max_concurrent` en ejecución y `max_queue`
+    esperando hasta `queue_timeout` segundos; el resto se rechaza de inmediato.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 0, queue_timeout: float = 0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrent)
+        return self._sem
+
+    async def acquire(self) -> None:
+        sem = self._semaphore()
+        if not sem.locked():
+            await sem.acquire()
+            self.active += 1
+            return
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(retry_after=max(self.queue_timeout, 1.0))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(retry_after=max(self.queue_timeout, 1.0))
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore().release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,88 @@
+# app/core/singleflight.py
+"""
+Coalescencia de lecturas idénticas concurrentes ("single-flight").
+
+Mientras una llamada para `key` está en vuelo, el resto de llamadas con la misma
+clave esperan su resultado en lugar de repetir el RPC. Sirve tanto para handlers
+síncronos (threadpool de Starlette) como async: ambos comparten el mismo registro
+de llamadas en vuelo, así que un líder sync puede atender a seguidores async y al revés.
+No es una caché: en cuanto termina la llamada, la siguiente vuelve a ir al backend.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+Runner = Callable[..., Awaitable[Any]]
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Devuelve (future, es_lider)."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+            fut = Future()
+            self._calls[key] = fut
+            return fut, True
+
+    def _run(self, key: Hashable, fut: Future, fn: Callable[[], T]) -> None:
+        try:
+            try:
+                result = fn()
+            except BaseException as e:
+                fut.set_exception(e)
+            else:
+                fut.set_result(result)
+        except InvalidStateError:
+            pass  # el líder async ya se rindió (timeout del runner) y resolvió el future
+        finally:
+            with self._lock:
+                if self._calls.get(key) is fut:
+                    del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Ejecuta `fn` (bloqueante) o espera la ejecución en curso para `key`."""
+        fut, leader = self._join(key)
+        if leader:
+            self._run(key, fut, fn)
+        return fut.result()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], T], runner: Optional[Runner] = None) -> T:
+        """
+        Versión async: el líder corre `fn` con `runner` (por defecto el threadpool de Starlette,
+        o p.ej. un bulkhead); los seguidores la esperan sin bloquear el loop.
+        """
+        fut, leader = self._join(key)
+        if leader:
+            if runner is None:
+                from starlette.concurrency import run_in_threadpool as runner
+            try:
+                await runner(self._run, key, fut, fn)
+            except BaseException as e:
+                # el runner rechazó la tarea (bulkhead lleno/timeout): que los seguidores no queden colgados
+                if not fut.done():
+                    fut.set_exception(e)
+                    with self._lock:
+                        if self._calls.get(key) is fut:
+                            del self._calls[key]
+                raise
+        return await asyncio.wrap_future(fut)
+
+
+# Registro compartido para las lecturas calientes del servicio
+reads = SingleFlight()
+
+
+def coalesce(namespace: str, key: Any, fn: Callable[[], T]) -> T:
+    return reads.do((namespace, key), fn)
+
+
+async def coalesce_async(namespace: str, key: Any, fn: Callable[[], T], runner: Optional[Runner] = None) -> T:
+    return await reads.do_async((namespace, key), fn, runner)
@@ -1,9 +1,11 @@
 # deps/auth.py
 from fastapi import Header, HTTPException, status, Request
-from firebase_admin import auth as fb_auth
 from typing import Optional
 from app.config import ENABLE_FIRESTORE_PROVISIONING, SESSION_COOKIE_NAME
-from app.core.firebase import firestore_db
+from app.core.firebase import firestore_db, firebase_auth as fb_auth
+from app.core.profiling import phase
+from app.core import bulkhead
+from app.deps.offload import offload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -55,6 +57,11 @@ def _verify_id_token_with_skew(token: str):
         raise
 
 async def get_current_user(request: Request, authorization: Optional[str] = Header(None)):
+    # verificar el token y leer/crear el perfil son llamadas bloqueantes a Firebase
+    with phase("auth"):
+        return await offload(bulkhead.firestore, _resolve_user, request, authorization)
+
+def _resolve_user(request: Request, authorization: Optional[str]):
     # 1) Intentar cookie de sesión
     session_cookie = request.cookies.get(SESSION_COOKIE_NAME)
     decoded = None
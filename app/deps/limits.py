@@ -0,0 +1,67 @@
+# app/deps/limits.py
+from fastapi import Depends, HTTPException, Request, status
+from typing import Dict
+
+from app.config import TRUSTED_PROXY_HOPS
+from app.core.ratelimit import ConcurrencyLimiter, Overloaded, get_rate_limit_store
+from app.deps.auth import get_current_user
+
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+
+def _client_ip(request: Request) -> str:
+    # Las primeras entradas de X-Forwarded-For las escribe el cliente (falsificables): solo
+    # confiamos en lo que agregaron nuestros TRUSTED_PROXY_HOPS proxies, contando desde la derecha
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def limiter_stats() -> Dict[str, Dict[str, int]]:
+    """Ocupación de cada limitador de concurrencia registrado por `concurrency_limit`."""
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+def _too_many(name: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Demasiadas solicitudes a '{name}'. Intenta de nuevo en unos segundos.",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+def rate_limit_user(name: str, per_minute: float, burst: int):
+    """Dependencia: token bucket por uid (requiere usuario autenticado)."""
+    async def _dep(user=Depends(get_current_user)):
+        retry_after = get_rate_limit_store().consume(f"{name}:uid:{user['uid']}", per_minute / 60.0, burst)
+        if retry_after:
+            raise _too_many(name, retry_after)
+    return _dep
+
+def rate_limit_ip(name: str, per_minute: float, burst: int):
+    """Dependencia: token bucket por IP (endpoints públicos)."""
+    async def _dep(request: Request):
+        retry_after = get_rate_limit_store().consume(f"{name}:ip:{_client_ip(request)}", per_minute / 60.0, burst)
+        if retry_after:
+            raise _too_many(name, retry_after)
+    return _dep
+
+def concurrency_limit(name: str, max_concurrent: int, max_queue: int = 0, queue_timeout: float = 0.0):
+    """
+    Dependencia: ocupa un cupo del limitador `name` mientras dura la petición.
+    Cola llena o espera agotada → 503 con Retry-After.
+    """
+    limiter = _limiters.setdefault(name, ConcurrencyLimiter(name, max_concurrent, max_queue, queue_timeout))
+
+    async def _dep():
+        try:
+            await limiter.acquire()
+        except Overloaded as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"'{name}' está saturado. Intenta de nuevo más tarde.",
+                headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+            )
+        try:
+            yield
+        finally:
+            limiter.release()
+    return _dep
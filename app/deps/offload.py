@@ -0,0 +1,38 @@
+# app/deps/offload.py
+from fastapi import HTTPException, status
+from typing import Any, Callable
+import inspect
+import logging
+
+from app.core.bulkhead import Bulkhead, BulkheadTimeout
+from app.core.ratelimit import Overloaded
+
+logger = logging.getLogger(__name__)
+
+async def offload(bulkhead: Bulkhead, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Ejecuta `fn` en el bulkhead de su backend (pool propio si es bloqueante, semáforo si es async).
+    Bulkhead saturado → 503 con Retry-After; timeout → 504.
+    """
+    try:
+        if inspect.iscoroutinefunction(fn):
+            return await bulkhead.run_async(fn, *args, **kwargs)
+        return await bulkhead.run(fn, *args, **kwargs)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"'{bulkhead.name}' está saturado. Intenta de nuevo más tarde.",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    except BulkheadTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"'{bulkhead.name}' no respondió a tiempo.",
+        )
+
+async def offload_best_effort(bulkhead: Bulkhead, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+    """Como `offload`, pero si el bulkhead falla solo se registra (el RAG lo repara el resync)."""
+    try:
+        await offload(bulkhead, fn, *args, **kwargs)
+    except HTTPException as e:
+        logger.warning("%s: %s omitido (%s)", bulkhead.name, getattr(fn, "__name__", fn), e.detail)
@@ -1,10 +1,15 @@
 # app/deps/permissions.py
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
 from typing import List, Tuple
 
 from app.core.firebase import firestore_db
+from app.deps.auth import get_current_user
+from app.core.singleflight import coalesce, coalesce_async
+from app.core.profiling import phase
+from app.core import bulkhead
+from app.deps.offload import offload
 
-def _read_roles_doc(uid: str) -> Tuple[List[str], bool, List[str]]:
+def _fetch_roles_doc(uid: str) -> Tuple[List[str], bool, List[str]]:
     """
     Devuelve (roles, platform_admin, admin_careers) desde la colección 'roles'.
     Estructura esperada del doc:
@@ -23,8 +28,18 @@ def _read_roles_doc(uid: str) -> Tuple[List[str], bool, List[str]]:
     admin_careers = list(data.get("admin_careers") or [])
     return roles, platform_admin, admin_careers
 
-def can_manage_career_or_403(uid: str, career: str):
-    roles, is_platform_admin, admin_careers = _read_roles_doc(uid)
+def _read_roles_doc(uid: str) -> Tuple[List[str], bool, List[str]]:
+    # lecturas concurrentes del mismo uid comparten un único get() a Firestore
+    with phase("permissions"):
+        return coalesce("roles", uid, lambda: _fetch_roles_doc(uid))
+
+async def _read_roles_doc_async(uid: str) -> Tuple[List[str], bool, List[str]]:
+    with phase("permissions"):
+        return await coalesce_async(
+            "roles", uid, lambda: _fetch_roles_doc(uid), runner=lambda fn, *a: offload(bulkhead.firestore, fn, *a)
+        )
+
+def _check_career(roles: List[str], is_platform_admin: bool, admin_careers: List[str], career: str):
     if is_platform_admin:
         return
     # permitimos si tiene rol admin y la carrera en su lista
@@ -35,6 +50,23 @@ def can_manage_career_or_403(uid: str, career: str):
         detail=f"No tienes permisos para gestionar productos de la carrera '{career}'.",
     )
 
+def can_manage_career_or_403(uid: str, career: str):
+    _check_career(*_read_roles_doc(uid), career)
+
+async def can_manage_career_or_403_async(uid: str, career: str):
+    """Variante para handlers async: no bloquea el event loop con el RPC."""
+    _check_career(*(await _read_roles_doc_async(uid)), career)
+
+async def require_platform_admin(user=Depends(get_current_user)):
+    """Dependencia para herramientas de administración de toda la plataforma."""
+    _, is_platform_admin, _ = await _read_roles_doc_async(user["uid"])
+    if not is_platform_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores de plataforma.",
+        )
+    return user
+
 def visible_careers_for(uid: str) -> List[str]:
     roles, is_platform_admin, admin_careers = _read_roles_doc(uid)
     if is_platform_admin:
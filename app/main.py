@@ -1,10 +1,77 @@
 # app/main.py  (añade esto)
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.products import router as products_router
-from app.config import ALLOWED_ORIGINS
+from app.config import (
+    ALLOWED_ORIGINS,
+    WARM_CLIENTS_ON_STARTUP,
+    CATALOG_SNAPSHOT_PATH,
+    CATALOG_SNAPSHOT_REFRESH_SECONDS,
+    CATALOG_SNAPSHOT_CHECK_SECONDS,
+    SLOW_REQUESTS_ENABLED,
+    SLOW_REQUESTS_CAPACITY,
+    CART_COMPACTION_INTERVAL_HOURS,
+    CATALOG_INDEX_ENABLED,
+    CHANGE_FEED_COMPACT_INTERVAL_SECONDS,
+)
+from app.core.profiling import SlowRequestMiddleware, recorder
+
+logger = logging.getLogger(__name__)
+
+def _warm_up_clients():
+    from app.core import firebase, rag_sync
+    try:
+        firebase.warm_up()
+        rag_sync.warm_up()
+    except Exception:
+        # no es fatal: el primer uso reintentará la creación del cliente
+        logger.exception("warm-up de clientes falló")
+
+def _warm_up_catalog():
+    from app.repositories import products_repo
+    try:
+        products_repo.warm_catalog_index()
+    except Exception:
+        # no es fatal: el primer listado lo construirá
+        logger.exception("warm-up del índice de catálogo falló")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Calentamos los clientes en un hilo aparte: /health responde sin esperar a los SDK
+    if WARM_CLIENTS_ON_STARTUP:
+        threading.Thread(target=_warm_up_clients, name="clients-warm-up", daemon=True).start()
+    if CATALOG_SNAPSHOT_PATH:
+        from app.repositories import products_repo
+        products_repo.start_catalog_snapshot(
+            CATALOG_SNAPSHOT_PATH, CATALOG_SNAPSHOT_REFRESH_SECONDS, CATALOG_SNAPSHOT_CHECK_SECONDS
+        )
+    if CATALOG_INDEX_ENABLED:
+        # después del snapshot: si ya hay uno publicado, el índice se carga de él y no de un scan
+        threading.Thread(target=_warm_up_catalog, name="catalog-warm-up", daemon=True).start()
+    if CHANGE_FEED_COMPACT_INTERVAL_SECONDS > 0:
+        from app.repositories import changes_repo
+        changes_repo.start_compaction_scheduler(CHANGE_FEED_COMPACT_INTERVAL_SECONDS)
+    if CART_COMPACTION_INTERVAL_HOURS > 0:
+        from app.services import cart_compaction
+        cart_compaction.start_scheduler(CART_COMPACTION_INTERVAL_HOURS * 3600)
+    yield
+    from app.core import catalog_snapshot
+    from app.services import images
+    # espera a que termine una publicación en curso sin bloquear el loop
+    await asyncio.to_thread(catalog_snapshot.manager.stop)
+    await images.close_client()
+
+app = FastAPI(title="Auth + FastAPI + Firebase", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="Auth + FastAPI + Firebase", version="1.0.0")
+from app.routers.profiling import router as profiling_router, PREFIX as PROFILING_PREFIX
+recorder.configure(enabled=SLOW_REQUESTS_ENABLED, capacity=SLOW_REQUESTS_CAPACITY)
+# desactivado solo cuesta leer un booleano por petición; las rutas de profiling no se registran
+app.add_middleware(SlowRequestMiddleware, exclude_prefixes=(PROFILING_PREFIX,))
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,6 +84,7 @@ app.add_middleware(
 app.include_router(products_router)
 from app.routers.cart import router as cart_router
 app.include_router(cart_router)
+app.include_router(profiling_router)
 
 @app.get("/health")
 def health():
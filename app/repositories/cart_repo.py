@@ -1,13 +1,84 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
+import logging
+import threading
+from app.config import CART_SNAPSHOTS_ENABLED
 from app.core.firebase import firestore_db
 
+logger = logging.getLogger(__name__)
+
 _COLLECTION = "carts"
+# Campos del producto que se desnormalizan en el carrito (snapshot.{pid})
+_SNAPSHOT_FIELDS = ("name", "price", "description", "image", "category", "career", "stock")
 
 def _now() -> datetime:
     return datetime.utcnow()
 
-from app.repositories import products_repo
+from app.repositories import products_repo, inventory_repo
+
+def _delete_field():
+    from google.cloud.firestore_v1.transforms import DELETE_FIELD
+    return DELETE_FIELD
+
+def _snapshot_of(product: Dict[str, Any]) -> Dict[str, Any]:
+    snap = {f: product[f] for f in _SNAPSHOT_FIELDS if f in product}
+    snap["version"] = product.get("updatedAt")
+    return snap
+
+def _resolve_products(ref, data: Dict[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Devuelve {pid: datos del producto o None si ya no existe} para los ítems del carrito,
+    con el stock vigente del inventario (caché de TTL corto) en lugar del del snapshot.
+    """
+    items_map = data.get("items", {})
+    if not CART_SNAPSHOTS_ENABLED:
+        return {pid: products_repo.get_product(pid) for pid in items_map}
+    resolved = _resolve_content(ref, data)
+    stocks = inventory_repo.get_stocks(pid for pid, p in resolved.items() if p)
+    for pid, product in resolved.items():
+        if product and stocks.get(pid) is not None:
+            product["stock"] = stocks[pid]
+    return resolved
+
+def _resolve_content(ref, data: Dict[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Usa el snapshot guardado en el carrito salvo que el índice de versiones diga que el
+    producto cambió; solo esos se releen (en un multi-get) y se reescriben en el carrito.
+    En el caso normal: lectura del carrito + índice (cacheado).
+    """
+    items_map = data.get("items", {})
+    snapshots = data.get("snapshot") or {}
+    versions = products_repo.get_version_index()
+    resolved: Dict[str, Optional[Dict[str, Any]]] = {}
+    stale = []
+    for pid in items_map:
+        snap = snapshots.get(pid)
+        if snap is not None and pid in versions and snap.get("version") == versions[pid]:
+            resolved[pid] = snap
+        else:
+            stale.append(pid)
+    if not stale:
+        return resolved
+
+    fetched = products_repo.get_products_by_ids(stale, with_stock=False)
+    updates = {}
+    for pid in stale:
+        product = fetched.get(pid)
+        resolved[pid] = product
+        if product:
+            updates[f"snapshot.{pid}"] = _snapshot_of(product)
+        elif pid in snapshots:
+            updates[f"snapshot.{pid}"] = _delete_field()
+    unindexed = [p for p in fetched.values() if p["id"] not in versions]
+    try:
+        if updates:
+            ref.update(updates)
+        if unindexed:
+            products_repo.backfill_versions(unindexed)
+    except Exception:
+        # el snapshot es solo una optimización: si no se puede guardar, se relee la próxima vez
+        logger.exception("No se pudo actualizar el snapshot del carrito %s", ref.id)
+    return resolved
 
 def get_cart(uid: str) -> Dict[str, Any]:
     doc = firestore_db.collection(_COLLECTION).document(uid).get()
@@ -33,12 +104,13 @@ def get_cart_enriched(uid: str) -> Dict[str, Any]:
     
     data = doc.to_dict()
     items_map = data.get("items", {})
+    products = _resolve_products(doc.reference, data)
     
     items_list = []
     for pid, qty in items_map.items():
         item_data = {"productId": pid, "quantity": qty}
         # Enrich with product details
-        product = products_repo.get_product(pid)
+        product = products.get(pid)
         
         if product:
             item_data["name"] = product.get("name", f"Unknown Name ({pid})")
@@ -65,12 +137,13 @@ def get_cart_frontend(uid: str) -> Dict[str, Any]:
     
     data = doc.to_dict()
     items_map = data.get("items", {})
+    products = _resolve_products(doc.reference, data)
     
     items_list = []
     for pid, qty in items_map.items():
         item_data = {"productId": pid, "quantity": qty}
         # Enrich with full product details
-        product = products_repo.get_product(pid)
+        product = products.get(pid)
         
         if product:
             item_data["name"] = product.get("name", "Unknown Product")
@@ -92,6 +165,13 @@ def get_cart_frontend(uid: str) -> Dict[str, Any]:
         "updatedAt": data.get("updatedAt")
     }
 
+def _drop_snapshot_if_removed(payload: Dict[str, Any], doc, product_id: str, current_items: Dict[str, int]):
+    """Si el ítem salió del carrito, borra también su snapshot desnormalizado."""
+    if not doc.exists or product_id in current_items:
+        return
+    if product_id in (doc.to_dict().get("snapshot") or {}):
+        payload[f"snapshot.{product_id}"] = _delete_field()
+
 def add_item(uid: str, product_id: str, quantity: int) -> Dict[str, Any]:
     """Adds quantity to existing item or creates new one."""
     ref = firestore_db.collection(_COLLECTION).document(uid)
@@ -116,6 +196,7 @@ def add_item(uid: str, product_id: str, quantity: int) -> Dict[str, Any]:
         "items": current_items,
         "updatedAt": _now()
     }
+    _drop_snapshot_if_removed(payload, doc, product_id, current_items)
     
     if not doc.exists:
         ref.set(payload)
@@ -145,6 +226,7 @@ def update_item_quantity(uid: str, product_id: str, quantity: int) -> Dict[str,
         "items": current_items,
         "updatedAt": _now()
     }
+    _drop_snapshot_if_removed(payload, doc, product_id, current_items)
     
     if not doc.exists:
         ref.set(payload)
@@ -167,6 +249,7 @@ def remove_item(uid: str, product_id: str) -> Dict[str, Any]:
             "items": current_items,
             "updatedAt": _now()
         }
+        _drop_snapshot_if_removed(payload, doc, product_id, current_items)
         ref.update(payload)
         
     return get_cart(uid)
@@ -174,3 +257,59 @@ def remove_item(uid: str, product_id: str) -> Dict[str, Any]:
 def clear_cart(uid: str) -> Dict[str, Any]:
     firestore_db.collection(_COLLECTION).document(uid).delete()
     return {"userId": uid, "items": []}
+
+# --- Mantenimiento (job de compactación) ---
+
+def count_carts() -> int:
+    result = firestore_db.collection(_COLLECTION).count().get()
+    return int(result[0][0].value)
+
+def list_carts_after(last_doc_id: Optional[str], page_size: int) -> List[Any]:
+    """Página de documentos de carrito (snapshots crudos, con update_time) en orden de ID."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    col = firestore_db.collection(_COLLECTION)
+    qry = col.order_by("__name__")
+    if last_doc_id:
+        qry = qry.where(filter=FieldFilter("__name__", ">", col.document(last_doc_id)))
+    return list(qry.limit(page_size).stream())
+
+def apply_compaction(deletes: List[Tuple[str, Any]], prunes: List[Tuple[str, Any, List[str]]]) -> Dict[str, Any]:
+    """
+    Aplica con un BulkWriter: borra carritos `(uid, update_time)` y quita ítems colgantes
+    `(uid, update_time, [pids])`. Cada escritura lleva la precondición `last_update_time`:
+    si el usuario tocó su carrito mientras tanto, esa escritura se descarta (conflicto) y
+    la siguiente corrida lo vuelve a evaluar. Devuelve los uids escritos y cuántos fallaron.
+    """
+    col = firestore_db.collection(_COLLECTION)
+    result: Dict[str, Any] = {"written": set(), "conflicts": 0, "errors": 0}
+    lock = threading.Lock()  # los callbacks del BulkWriter pueden llegar desde otros hilos
+    writer = firestore_db.bulk_writer()
+
+    def _on_result(reference, _result, _writer) -> None:
+        with lock:
+            result["written"].add(reference.id)
+
+    def _on_error(failure, _writer) -> bool:
+        uid = failure.operation.reference.id
+        with lock:
+            if failure.code == 9:  # FAILED_PRECONDITION
+                result["conflicts"] += 1
+            else:
+                result["errors"] += 1
+        if failure.code != 9:
+            logger.warning("compactación de carritos: falló %s (%s): %s", uid, failure.code, failure.message)
+        return False  # sin reintentos: la próxima corrida lo reevalúa
+
+    writer.on_write_result(_on_result)
+    writer.on_write_error(_on_error)
+    for uid, update_time in deletes:
+        writer.delete(col.document(uid), option=firestore_db.write_option(last_update_time=update_time))
+    for uid, update_time, pids in prunes:
+        fields = {}
+        for pid in pids:
+            fields[f"items.{pid}"] = _delete_field()
+            fields[f"snapshot.{pid}"] = _delete_field()
+        writer.update(col.document(uid), fields, option=firestore_db.write_option(last_update_time=update_time))
+    writer.close()
+    return result
@@ -0,0 +1,108 @@
+# app/repositories/changes_repo.py
+"""
+Change feed del catálogo: log compacto de upserts y tombstones de productos.
+
+Cada entrada es un documento en `product_changes` cuyo ID es
+`{updatedAt en µs, 20 dígitos}-{productId}`, así que el orden por ID de documento es el
+orden (updatedAt, id) y el token de reanudación es simplemente el último ID entregado.
+Compactación: cada escritura borra la entrada anterior del mismo producto (solo importa
+el último estado) y los tombstones vencidos se purgan; si un cliente trae un token más
+viejo que lo purgado, se le pide un resync completo (`reset_required`).
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import (
+    CHANGE_FEED_SAFETY_LAG_SECONDS,
+    CHANGE_FEED_TOMBSTONE_RETENTION_DAYS,
+)
+from app.core.catalog_snapshot import to_micros
+from app.core.firebase import firestore_db
+
+_COLLECTION = "product_changes"
+_META_COLLECTION = "catalog_meta"
+_META_DOC = "change_feed"
+
+logger = logging.getLogger(__name__)
+
+# formato de `_entry_id` (y por tanto de los next_token): µs con 20 dígitos + "-" + id de producto
+_TOKEN_RE = re.compile(r"^\d{20}-[^/]+$")
+
+def _entry_id(ts: datetime, prod_id: str) -> str:
+    return f"{to_micros(ts):020d}-{prod_id}"
+
+def _col():
+    return firestore_db.collection(_COLLECTION)
+
+def add_to_batch(batch, prod_id: str, op: str, ts: datetime, previous_ts: Optional[datetime] = None) -> None:
+    """Agrega al batch la entrada nueva y el borrado de la que reemplaza (compactación)."""
+    batch.set(_col().document(_entry_id(ts, prod_id)), {"productId": prod_id, "op": op, "ts": ts})
+    if previous_ts is not None and to_micros(previous_ts) != to_micros(ts):
+        batch.delete(_col().document(_entry_id(previous_ts, prod_id)))
+
+def _horizon() -> str:
+    doc = firestore_db.collection(_META_COLLECTION).document(_META_DOC).get()
+    return (doc.to_dict() or {}).get("compacted_before", "") if doc.exists else ""
+
+def list_changes(since: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str], bool, bool]:
+    """
+    Devuelve (entradas, next_token, has_more, reset_required) posteriores a `since`
+    (ValueError si `since` no tiene el formato de un token emitido por el feed).
+    No entrega entradas de los últimos CHANGE_FEED_SAFETY_LAG_SECONDS: así una escritura
+    en curso (o de un worker con reloj algo atrasado) no queda detrás de un token ya entregado.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    if since and not _TOKEN_RE.fullmatch(since):
+        raise ValueError("Token de cambios inválido")
+    if since and since < _horizon():
+        return [], None, False, True
+
+    upper = f"{to_micros(datetime.utcnow() - timedelta(seconds=CHANGE_FEED_SAFETY_LAG_SECONDS)):020d}"
+    qry = _col().order_by("__name__").where(filter=FieldFilter("__name__", "<", _col().document(upper)))
+    if since:
+        qry = qry.where(filter=FieldFilter("__name__", ">", _col().document(since)))
+    docs = list(qry.limit(limit + 1).stream())
+    entries = [{"token": d.id, **(d.to_dict() or {})} for d in docs[:limit]]
+    next_token = entries[-1]["token"] if entries else since
+    return entries, next_token, len(docs) > limit, False
+
+def compact_tombstones() -> int:
+    """Purga tombstones más viejos que la retención y adelanta el horizonte. Devuelve cuántos borró."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    cutoff = datetime.utcnow() - timedelta(days=CHANGE_FEED_TOMBSTONE_RETENTION_DAYS)
+    horizon = f"{to_micros(cutoff):020d}"
+    qry = (
+        _col()
+        .order_by("__name__")
+        .where(filter=FieldFilter("__name__", "<", _col().document(horizon)))
+        .where(filter=FieldFilter("op", "==", "delete"))
+    )
+    removed = 0
+    batch = firestore_db.batch()
+    for doc in qry.stream():
+        batch.delete(doc.reference)
+        removed += 1
+        if removed % 400 == 0:
+            batch.commit()
+            batch = firestore_db.batch()
+    batch.set(firestore_db.collection(_META_COLLECTION).document(_META_DOC), {"compacted_before": horizon}, merge=True)
+    batch.commit()
+    return removed
+
+def start_compaction_scheduler(interval_seconds: float) -> None:
+    """Purga tombstones cada `interval_seconds` (lo lanza el lifespan; es idempotente entre workers)."""
+    def _loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                compact_tombstones()
+            except Exception:
+                logger.exception("no se pudo compactar el change feed")
+
+    threading.Thread(target=_loop, name="change-feed-compaction", daemon=True).start()
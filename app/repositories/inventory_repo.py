@@ -0,0 +1,99 @@
+# app/repositories/inventory_repo.py
+"""
+Inventario separado del contenido del catálogo: `inventory/{productId}` = {stock, updatedAt}.
+
+El stock cambia con cada venta; tenerlo aparte evita que esos cambios toquen el
+`updatedAt` del producto (y con ello el índice de versiones, los snapshots, los
+índices en memoria y los embeddings del RAG). Se lee en batch y se mezcla en la
+respuesta, con su propia caché de TTL corto.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import INVENTORY_CACHE_TTL_SECONDS
+from app.core.firebase import firestore_db
+
+_COLLECTION = "inventory"
+_GET_ALL_CHUNK = 100
+_MISSING = object()  # sin doc de inventario: vale el `stock` legado del producto
+
+_lock = threading.Lock()
+_cache: Dict[str, Any] = {}  # pid -> (stock | _MISSING, expires)
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+def doc_ref(prod_id: str):
+    """Doc de inventario del producto (p.ej. para leerlo junto al producto en un get_all)."""
+    return firestore_db.collection(_COLLECTION).document(prod_id)
+
+def invalidate(prod_id: str) -> None:
+    """Llamar tras el commit de una escritura de inventario hecha en batch."""
+    with _lock:
+        _cache.pop(prod_id, None)
+
+def stock_of(doc) -> Optional[int]:
+    """Stock de un snapshot de inventario; None si no tiene doc (vale el legado del producto)."""
+    return int((doc.to_dict() or {}).get("stock") or 0) if doc.exists else None
+
+def set_stock(prod_id: str, stock: int, batch=None, read=None) -> None:
+    """
+    Con `read` (el snapshot de inventario leído antes de escribir) la escritura es
+    condicional: falla si el doc cambió (`last_update_time`) o si apareció (`create`).
+    """
+    payload = {"stock": int(stock), "updatedAt": _now()}
+    if batch is not None:
+        if read is None:
+            batch.set(doc_ref(prod_id), payload)
+        elif read.exists:
+            batch.update(doc_ref(prod_id), payload, option=firestore_db.write_option(last_update_time=read.update_time))
+        else:
+            batch.create(doc_ref(prod_id), payload)
+        return
+    doc_ref(prod_id).set(payload)
+    invalidate(prod_id)
+
+def delete(prod_id: str, batch) -> None:
+    batch.delete(doc_ref(prod_id))
+
+def get_stocks(prod_ids: Iterable[str]) -> Dict[str, Optional[int]]:
+    """{pid: stock} (None si el producto no tiene doc de inventario). Un get_all por bloque de fallos de caché."""
+    unique = list(dict.fromkeys(prod_ids))
+    now = time.monotonic()
+    out: Dict[str, Optional[int]] = {}
+    misses: List[str] = []
+    with _lock:
+        for pid in unique:
+            hit = _cache.get(pid)
+            if hit is not None and hit[1] > now:
+                out[pid] = None if hit[0] is _MISSING else hit[0]
+            else:
+                misses.append(pid)
+    fetched: Dict[str, Any] = {}
+    for i in range(0, len(misses), _GET_ALL_CHUNK):
+        refs = [doc_ref(pid) for pid in misses[i:i + _GET_ALL_CHUNK]]
+        for doc in firestore_db.get_all(refs):
+            stock = stock_of(doc)
+            fetched[doc.id] = _MISSING if stock is None else stock
+    expires = time.monotonic() + INVENTORY_CACHE_TTL_SECONDS
+    with _lock:
+        for pid in misses:
+            value = fetched.get(pid, _MISSING)
+            _cache[pid] = (value, expires)
+            out[pid] = None if value is _MISSING else value
+    return out
+
+def merge_stock(products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sobrescribe (in place) `stock` con el inventario vigente de cada producto."""
+    if not products:
+        return products
+    stocks = get_stocks(p["id"] for p in products)
+    for p in products:
+        stock = stocks.get(p["id"])
+        if stock is not None:
+            p["stock"] = stock
+        else:
+            p["stock"] = p.get("stock", 0)
+    return products
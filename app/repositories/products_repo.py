@@ -1,11 +1,34 @@
 # app/repositories/products_repo.py
-from typing import Optional, List, Tuple, Dict, Any
+import threading
+import time
+import zlib
+from typing import Optional, List, Tuple, Dict, Any, Iterable, Callable
 from datetime import datetime
-from google.cloud.firestore_v1.base_query import FieldFilter, Or, And, BaseCompositeFilter
-
+from app.config import PRODUCT_VERSION_INDEX_TTL_SECONDS, PRODUCT_VERSION_INDEX_SHARDS, CATALOG_INDEX_ENABLED
 from app.core.firebase import firestore_db
+from app.core.singleflight import coalesce
+from app.core import catalog_snapshot
+from app.core.catalog_index import CatalogIndex, SortOption
+from app.repositories import changes_repo, inventory_repo
 
 _COLLECTION = "products"
+# Índice de versiones {prod_id: updatedAt} repartido en PRODUCT_VERSION_INDEX_SHARDS documentos
+# (por hash del ID): permite decidir con UN get_all qué snapshots desnormalizados (p.ej. en
+# carritos) siguen vigentes, sin que todas las escrituras del catálogo caigan en el mismo
+# documento. Cada shard es un mapa grande: el campo `versions` debe estar exento de índices
+# (ver firestore.indexes.json). Techo: ~1 MiB por shard ≈ 15-20k productos por shard.
+_META_COLLECTION = "catalog_meta"
+_VERSIONS_DOC = "product_versions"
+_GET_ALL_CHUNK = 100
+_BACKFILL_CHUNK = 400
+
+# Índices ordenados en memoria para listar (precio/nombre/recientes) sin índices compuestos
+_catalog = CatalogIndex()
+_catalog_lock = threading.Lock()
+_catalog_synced: Dict[str, Any] = {"versions": None}
+
+_versions_lock = threading.Lock()
+_versions_cache: Dict[str, Any] = {"expires": 0.0, "versions": None, "generation": 0}
 
 def _now() -> datetime:
     # Firestore Admin acepta aware/naive; usamos UTC naive para uniformidad
@@ -17,6 +40,7 @@ def _doc_to_out(doc) -> Dict[str, Any]:
     # normalizamos timestamps
     data["createdAt"] = data.get("createdAt")
     data["updatedAt"] = data.get("updatedAt")
+    data.setdefault("images", [])  # productos anteriores a la galería
     return data
 
 def create_product(payload: Dict[str, Any], uid: str) -> Dict[str, Any]:
@@ -27,35 +51,348 @@ def create_product(payload: Dict[str, Any], uid: str) -> Dict[str, Any]:
         "updatedAt": ts,
         "createdBy": uid,
     }
+    # el stock vive en `inventory`, no en el documento del catálogo
+    stock = payload.pop("stock", 0) or 0
     ref = firestore_db.collection(_COLLECTION).document()
-    ref.set(payload)
-    return {**payload, "id": ref.id}
+    # producto + inventario + índice de versiones + change feed en un solo commit
+    batch = firestore_db.batch()
+    batch.set(ref, payload)
+    inventory_repo.set_stock(ref.id, stock, batch)
+    _record_versions({ref.id: ts}, batch)
+    changes_repo.add_to_batch(batch, ref.id, "upsert", ts)
+    batch.commit()
+    _invalidate_versions_cache()
+    created = {**payload, "id": ref.id}
+    if _catalog.loaded:
+        _catalog.upsert(created)
+    return {**created, "stock": stock}
 
-def get_product(prod_id: str) -> Optional[Dict[str, Any]]:
+def _fetch_product(prod_id: str) -> Optional[Dict[str, Any]]:
     doc = firestore_db.collection(_COLLECTION).document(prod_id).get()
     if not doc.exists:
         return None
     return _doc_to_out(doc)
 
-def update_product(prod_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    doc_ref = firestore_db.collection(_COLLECTION).document(prod_id)
-    doc = doc_ref.get()
+def _from_snapshot(prod_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Producto desde el snapshot compartido (mmap) si está activo y su fila está al día
+    según el índice de versiones; None si hay que ir a Firestore.
+    """
+    snap = catalog_snapshot.manager.current()
+    if snap is None:
+        return None
+    row = snap.get(prod_id)
+    if row is None:
+        return None
+    current = get_version_index().get(prod_id)
+    if current is None or catalog_snapshot.to_micros(current) != catalog_snapshot.to_micros(row["updatedAt"]):
+        return None
+    return row
+
+def _get_product_content(prod_id: str) -> Optional[Dict[str, Any]]:
+    p = _from_snapshot(prod_id)
+    if p is not None:
+        return p
+    # lecturas concurrentes del mismo producto comparten un único get() a Firestore
+    p = coalesce(_COLLECTION, prod_id, lambda: _fetch_product(prod_id))
+    return dict(p) if p else None  # copia: el resultado es compartido entre llamadas
+
+def get_product(prod_id: str) -> Optional[Dict[str, Any]]:
+    p = _get_product_content(prod_id)
+    if p is not None:
+        inventory_repo.merge_stock([p])
+    return p
+
+class ProductConflict(Exception):
+    """El producto o su inventario cambió entre la lectura y la escritura (falló una precondición)."""
+
+def get_product_for_write(prod_id: str) -> Optional[Tuple[Dict[str, Any], Any, Any]]:
+    """
+    Lectura directa a Firestore (sin snapshot ni caché) del producto y su inventario en un
+    solo get_all: (producto con stock, update_time del producto, snapshot del inventario)
+    o None si no existe.
+    """
+    prod_ref = firestore_db.collection(_COLLECTION).document(prod_id)
+    inv_ref = inventory_repo.doc_ref(prod_id)
+    docs = {doc.reference.path: doc for doc in firestore_db.get_all([prod_ref, inv_ref])}
+    doc, inv = docs[prod_ref.path], docs[inv_ref.path]
     if not doc.exists:
         return None
+    product = _doc_to_out(doc)
+    stock = inventory_repo.stock_of(inv)
+    product["stock"] = stock if stock is not None else product.get("stock", 0)
+    return product, doc.update_time, inv
+
+def _commit_conditional(batch, prod_id: str) -> None:
+    from google.api_core.exceptions import Conflict, FailedPrecondition
+
+    try:
+        batch.commit()
+    except (FailedPrecondition, Conflict):  # Conflict: el doc de inventario apareció (create)
+        raise ProductConflict(prod_id)
+
+def update_product(
+    prod_id: str,
+    payload: Dict[str, Any],
+    check: Optional[Callable[[Dict[str, Any]], None]] = None,
+    expect: Any = None,
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Actualización condicional con una sola lectura: lee producto + inventario, corre
+    `check` (p.ej. permisos) sobre esa lectura y escribe con precondiciones sobre lo leído
+    (`last_update_time` del producto si cambia su contenido; del inventario si cambia el
+    stock). La respuesta se arma con lo leído más el delta, sin releer. Con `expect` (el
+    update_time de una lectura previa del caller) también falla si el producto cambió desde
+    entonces. Devuelve (antes, después) o None si no existe; si otro escritor se adelantó,
+    lanza `ProductConflict` y no escribe nada.
+    """
+    read = get_product_for_write(prod_id)
+    if read is None:
+        return None
+    before, update_time, inventory = read
+    if expect is not None and update_time != expect:
+        raise ProductConflict(prod_id)
+    if check is not None:
+        check(before)
     update = {k: v for (k, v) in payload.items() if v is not None}
-    if not update:
+    stock = update.pop("stock", None)
+    if not update and stock is None:
         # nada que actualizar
-        return _doc_to_out(doc)
-    update["updatedAt"] = _now()
-    doc_ref.set(update, merge=True)
-    return _doc_to_out(doc_ref.get())
+        return before, before
+    batch = firestore_db.batch()
+    if stock is not None:
+        # solo inventario: no toca updatedAt, así que no invalida cachés ni snapshots del catálogo
+        inventory_repo.set_stock(prod_id, stock, batch, read=inventory)
+    if update:
+        update["updatedAt"] = _now()
+        doc_ref = firestore_db.collection(_COLLECTION).document(prod_id)
+        batch.update(doc_ref, update, option=firestore_db.write_option(last_update_time=update_time))
+        _record_versions({prod_id: update["updatedAt"]}, batch)
+        changes_repo.add_to_batch(batch, prod_id, "upsert", update["updatedAt"], before.get("updatedAt"))
+    _commit_conditional(batch, prod_id)
+    if stock is not None:
+        inventory_repo.invalidate(prod_id)
+    after = {**before, **update, **({"stock": stock} if stock is not None else {})}
+    if update:
+        _invalidate_versions_cache()
+        if _catalog.loaded:
+            _catalog.upsert({**before, **update})
+    return before, after
 
-def delete_product(prod_id: str) -> bool:
+def delete_product(prod_id: str, check: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Borrado condicional con una sola lectura (mismo contrato que `update_product`).
+    Devuelve el producto borrado o None si no existía.
+    """
+    read = get_product_for_write(prod_id)
+    if read is None:
+        return None
+    content, update_time, _ = read
+    if check is not None:
+        check(content)
     doc_ref = firestore_db.collection(_COLLECTION).document(prod_id)
-    if not doc_ref.get().exists:
-        return False
-    doc_ref.delete()
-    return True
+    batch = firestore_db.batch()
+    batch.delete(doc_ref, option=firestore_db.write_option(last_update_time=update_time))
+    inventory_repo.delete(prod_id, batch)
+    _drop_version(prod_id, batch)
+    changes_repo.add_to_batch(batch, prod_id, "delete", _now(), content.get("updatedAt"))
+    _commit_conditional(batch, prod_id)
+    _invalidate_versions_cache()
+    inventory_repo.invalidate(prod_id)
+    _catalog.remove(prod_id)
+    return content
+
+def get_products_by_ids(
+    prod_ids: Iterable[str], with_stock: bool = True, fields: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Multi-get por IDs (get_all en bloques). Devuelve solo los que existen, indexados por id.
+    `with_stock=False` devuelve solo el contenido del catálogo (sin leer inventario).
+    `fields` pide a Firestore solo esos campos (proyección en el servidor).
+    """
+    unique = list(dict.fromkeys(prod_ids))
+    found: Dict[str, Dict[str, Any]] = {}
+    if catalog_snapshot.manager.enabled:
+        for pid in unique:
+            p = _from_snapshot(pid)
+            if p is not None:
+                found[pid] = p
+        unique = [pid for pid in unique if pid not in found]
+    col = firestore_db.collection(_COLLECTION)
+    for i in range(0, len(unique), _GET_ALL_CHUNK):
+        refs = [col.document(pid) for pid in unique[i:i + _GET_ALL_CHUNK]]
+        for doc in firestore_db.get_all(refs, field_paths=fields):
+            if doc.exists:
+                found[doc.id] = _doc_to_out(doc)
+    if with_stock:
+        inventory_repo.merge_stock(list(found.values()))
+    return found
+
+def existing_ids(prod_ids: Iterable[str]) -> set:
+    """Cuáles de los IDs existen: get_all en bloques con máscara vacía (no trae campos)."""
+    unique = list(dict.fromkeys(prod_ids))
+    col = firestore_db.collection(_COLLECTION)
+    found = set()
+    for i in range(0, len(unique), _GET_ALL_CHUNK):
+        refs = [col.document(pid) for pid in unique[i:i + _GET_ALL_CHUNK]]
+        found.update(doc.id for doc in firestore_db.get_all(refs, field_paths=[]) if doc.exists)
+    return found
+
+def get_products_batch(
+    prod_ids: Iterable[str], fields: Optional[Iterable[str]] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Multi-get para la API: (encontrados en el orden pedido, sin duplicados; IDs inexistentes).
+    Con `fields` solo se devuelven esos campos (más `id`) y el inventario se lee solo si
+    se pidió `stock`.
+    """
+    unique = list(dict.fromkeys(prod_ids))
+    wanted = None if fields is None else list(dict.fromkeys(["id", *fields]))
+    content_fields = None if wanted is None else [f for f in wanted if f not in ("id", "stock")]
+    found = get_products_by_ids(
+        unique,
+        with_stock=wanted is None or "stock" in wanted,
+        # el stock legado puede seguir en el doc del producto: lo pedimos para el fallback
+        fields=None if content_fields is None else content_fields + (["stock"] if "stock" in wanted else []),
+    )
+    items, missing = [], []
+    for pid in unique:
+        p = found.get(pid)
+        if p is None:
+            missing.append(pid)
+        elif wanted is None:
+            items.append(p)
+        else:
+            items.append({f: p.get(f) for f in wanted})
+    return items, missing
+
+# --- Índice de versiones ---
+
+def _shard_of(prod_id: str) -> int:
+    # crc32 y no hash(): tiene que dar lo mismo en todos los procesos
+    return zlib.crc32(prod_id.encode("utf-8")) % PRODUCT_VERSION_INDEX_SHARDS
+
+def _versions_ref(shard: int):
+    return firestore_db.collection(_META_COLLECTION).document(f"{_VERSIONS_DOC}_{shard}")
+
+def _by_shard(versions: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    shards: Dict[int, Dict[str, Any]] = {}
+    for pid, value in versions.items():
+        shards.setdefault(_shard_of(pid), {})[pid] = value
+    return shards
+
+def _invalidate_versions_cache() -> None:
+    with _versions_lock:
+        _versions_cache["expires"] = 0.0
+        _versions_cache["generation"] += 1
+
+def _record_versions(versions: Dict[str, Any], batch=None) -> None:
+    """Registra versiones; con `batch`, solo agrega la escritura (el caller hace commit e invalida)."""
+    if not versions:
+        return
+    own_batch = batch is None
+    batch = batch or firestore_db.batch()
+    for shard, chunk in _by_shard(versions).items():
+        batch.set(_versions_ref(shard), {"versions": chunk}, merge=True)
+    if own_batch:
+        batch.commit()
+        _invalidate_versions_cache()
+
+def _drop_version(prod_id: str, batch) -> None:
+    from google.cloud.firestore_v1.transforms import DELETE_FIELD
+
+    # set(merge) con DELETE_FIELD no falla aunque el índice aún no exista
+    batch.set(_versions_ref(_shard_of(prod_id)), {"versions": {prod_id: DELETE_FIELD}}, merge=True)
+
+def _fetch_version_index() -> Dict[str, Any]:
+    refs = [_versions_ref(i) for i in range(PRODUCT_VERSION_INDEX_SHARDS)]
+    versions: Dict[str, Any] = {}
+    for doc in firestore_db.get_all(refs):
+        if doc.exists:
+            versions.update((doc.to_dict() or {}).get("versions", {}))
+    return versions
+
+def get_version_index() -> Dict[str, Any]:
+    """
+    Devuelve {prod_id: updatedAt}. Se cachea en el proceso PRODUCT_VERSION_INDEX_TTL_SECONDS
+    (las escrituras locales lo invalidan; las de otros workers se ven tras el TTL).
+    """
+    now = time.monotonic()
+    with _versions_lock:
+        if _versions_cache["versions"] is not None and now < _versions_cache["expires"]:
+            return _versions_cache["versions"]
+        generation = _versions_cache["generation"]
+    versions = coalesce(_META_COLLECTION, _VERSIONS_DOC, _fetch_version_index)
+    with _versions_lock:
+        # si hubo una escritura local mientras leíamos, no cacheamos un índice viejo
+        if generation == _versions_cache["generation"]:
+            _versions_cache["versions"] = versions
+            _versions_cache["expires"] = now + PRODUCT_VERSION_INDEX_TTL_SECONDS
+    return versions
+
+def backfill_versions(products: Iterable[Dict[str, Any]]) -> None:
+    """
+    Registra en el índice de versiones (y en el change feed) productos anteriores a ellos;
+    se llama al detectar que faltan.
+    """
+    versions = {p["id"]: p["updatedAt"] for p in products if p.get("updatedAt") is not None}
+    if not versions:
+        return
+    items = list(versions.items())
+    # Firestore admite hasta 500 escrituras por batch
+    for i in range(0, len(items), _BACKFILL_CHUNK):
+        chunk = dict(items[i:i + _BACKFILL_CHUNK])
+        batch = firestore_db.batch()
+        _record_versions(chunk, batch)
+        for pid, ts in chunk.items():
+            changes_repo.add_to_batch(batch, pid, "upsert", ts)
+        batch.commit()
+    _invalidate_versions_cache()
+
+# --- Índice de catálogo en memoria ---
+
+def _reconcile_catalog(versions: Dict[str, Any]) -> None:
+    """Aplica al índice en memoria los cambios hechos por otros workers (según el índice de versiones)."""
+    to_micros = catalog_snapshot.to_micros
+    stale = [
+        pid for pid, v in versions.items()
+        if pid not in _catalog.products or to_micros(_catalog.products[pid].get("updatedAt")) != to_micros(v)
+    ]
+    gone = [pid for pid in _catalog.products if pid not in versions]
+    if stale:
+        fresh = get_products_by_ids(stale, with_stock=False)
+        for pid in stale:
+            if pid in fresh:
+                _catalog.upsert(fresh[pid])
+            else:
+                gone.append(pid)
+    for pid in gone:
+        _catalog.remove(pid)
+
+def warm_catalog_index() -> None:
+    """
+    Construye el índice al arrancar (el lifespan lo llama en un hilo), para que el primer
+    listado no pague el scan completo ni el backfill de versiones dentro de un GET.
+    """
+    _catalog_index()
+
+def _catalog_index() -> CatalogIndex:
+    """
+    Devuelve el índice cargado y al día. Lo construye `warm_catalog_index` al arrancar;
+    si aún no terminó, espera al lock, y sin warm-up (p.ej. benchmarks) lo construye aquí.
+    """
+    with _catalog_lock:
+        if not _catalog.loaded:
+            snap = catalog_snapshot.manager.current()
+            _catalog.load(snap.iter_rows() if snap is not None else iter_all_products())
+            versions = get_version_index()
+            # productos anteriores al índice de versiones: se registran para poder reconciliar
+            backfill_versions([p for p in _catalog.products.values() if p["id"] not in versions])
+        versions = get_version_index()
+        if _catalog_synced["versions"] is not versions:
+            _reconcile_catalog(versions)
+            _catalog_synced["versions"] = versions
+    return _catalog
 
 def list_products(
     q: Optional[str],
@@ -64,7 +401,22 @@ def list_products(
     limit: int = 50,
     cursor_iso: Optional[str] = None,
     restrict_to_careers: Optional[List[str]] = None,  # si se provee, filtra a estas carreras
+    sort: SortOption = "newest",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
 ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if CATALOG_INDEX_ENABLED:
+        items, next_cursor = _catalog_index().query(
+            sort=sort, category=category, career=career, careers=restrict_to_careers,
+            min_price=min_price, max_price=max_price, q=q, limit=limit, cursor=cursor_iso,
+        )
+        return inventory_repo.merge_stock(items), next_cursor
+    if sort != "newest" or min_price is not None or max_price is not None:
+        raise ValueError("Orden por precio/nombre y filtro de precio requieren CATALOG_INDEX_ENABLED")
+
+    # import diferido: el SDK de Firestore es pesado y no hace falta para arrancar
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
     # construimos query
     qry = firestore_db.collection(_COLLECTION).order_by("createdAt", direction="DESCENDING")
 
@@ -100,10 +452,36 @@ def list_products(
         results.append(item)
 
     next_cursor = results[-1]["createdAt"].isoformat() if results else None
-    return results, next_cursor
+    return inventory_repo.merge_stock(results), next_cursor
+
+def count_products() -> int:
+    """Conteo por agregación (no lee los documentos)."""
+    result = firestore_db.collection(_COLLECTION).count().get()
+    return int(result[0][0].value)
+
+def list_products_after(last_doc_id: Optional[str], page_size: int) -> List[Dict[str, Any]]:
+    """Página de productos en orden de ID de documento, empezando después de `last_doc_id`."""
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    col = firestore_db.collection(_COLLECTION)
+    qry = col.order_by("__name__")
+    if last_doc_id:
+        qry = qry.where(filter=FieldFilter("__name__", ">", col.document(last_doc_id)))
+    return inventory_repo.merge_stock([_doc_to_out(d) for d in qry.limit(page_size).stream()])
+
+def start_catalog_snapshot(path: str, refresh_seconds: float, check_seconds: float) -> None:
+    """Activa el snapshot mmap compartido; se reconstruye cuando cambia el índice de versiones."""
+    catalog_snapshot.manager.start(
+        path,
+        load_rows=iter_all_products,
+        fetch_rows=lambda ids: get_products_by_ids(ids, with_stock=False),
+        version_probe=get_version_index,
+        refresh_seconds=refresh_seconds,
+        check_seconds=check_seconds,
+    )
 
 def iter_all_products():
-    """Generador que devuelve todos los productos de la colección."""
+    """Generador que devuelve todos los productos de la colección (contenido, sin mezclar inventario)."""
     docs = firestore_db.collection(_COLLECTION).stream()
     for d in docs:
         yield _doc_to_out(d)
@@ -1,39 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from typing import List
 
 from app.deps.auth import get_current_user
+from app.deps.permissions import require_platform_admin
+from app.deps.limits import concurrency_limit
 from app.schemas.cart import CartOut, CartItemIn, CartEnrichedOut, CartFrontendOut
 from app.repositories import cart_repo
+from app.services import cart_compaction
+from app.core.profiling import ProfiledRoute
+from app.core import bulkhead
+from app.deps.offload import offload
 
 router = APIRouter(
     prefix="/api/cart",
-    tags=["Cart"]
+    tags=["Cart"],
+    route_class=ProfiledRoute,
 )
 
 @router.get("", response_model=CartOut)
-def get_my_cart(user=Depends(get_current_user)):
-    return cart_repo.get_cart(user["uid"])
+async def get_my_cart(user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.get_cart, user["uid"])
 
 @router.get("/chatbot", response_model=CartEnrichedOut)
-def get_my_cart_chatbot(user=Depends(get_current_user)):
-    return cart_repo.get_cart_enriched(user["uid"])
+async def get_my_cart_chatbot(user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.get_cart_enriched, user["uid"])
 
 @router.get("/details", response_model=CartFrontendOut)
-def get_my_cart_details_frontend(user=Depends(get_current_user)):
-    return cart_repo.get_cart_frontend(user["uid"])
+async def get_my_cart_details_frontend(user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.get_cart_frontend, user["uid"])
 
 @router.post("/items", response_model=CartOut)
-def add_item_to_cart(item: CartItemIn, user=Depends(get_current_user)):
-    return cart_repo.add_item(user["uid"], item.productId, item.quantity)
+async def add_item_to_cart(item: CartItemIn, user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.add_item, user["uid"], item.productId, item.quantity)
 
 @router.put("/items", response_model=CartOut)
-def update_item_quantity(item: CartItemIn, user=Depends(get_current_user)):
-    return cart_repo.update_item_quantity(user["uid"], item.productId, item.quantity)
+async def update_item_quantity(item: CartItemIn, user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.update_item_quantity, user["uid"], item.productId, item.quantity)
 
 @router.delete("/items/{product_id}", response_model=CartOut)
-def remove_item_from_cart(product_id: str, user=Depends(get_current_user)):
-    return cart_repo.remove_item(user["uid"], product_id)
+async def remove_item_from_cart(product_id: str, user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.remove_item, user["uid"], product_id)
 
 @router.delete("", response_model=CartOut)
-def clear_my_cart(user=Depends(get_current_user)):
-    return cart_repo.clear_cart(user["uid"])
+async def clear_my_cart(user=Depends(get_current_user)):
+    return await offload(bulkhead.firestore, cart_repo.clear_cart, user["uid"])
+
+# --- COMPACTACIÓN (ADMIN TOOL) ---
+@router.post(
+    "/compaction",
+    tags=["admin"],
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_platform_admin), Depends(concurrency_limit("cart-compaction", max_concurrent=1))],
+)
+async def start_cart_compaction(restart: bool = Query(False, description="Ignorar el checkpoint y empezar desde cero")):
+    """
+    Lanza en segundo plano la compactación de `carts`: quita ítems de productos borrados y
+    elimina carritos inactivos. Progreso en /compaction/status.
+    """
+    try:
+        return await offload(bulkhead.firestore, cart_compaction.start, restart=restart)
+    except cart_compaction.CartCompactionBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay una compactación en curso en otra instancia.")
+
+@router.get("/compaction/status", tags=["admin"], dependencies=[Depends(require_platform_admin)])
+async def cart_compaction_status():
+    return await offload(bulkhead.firestore, cart_compaction.get_status)
@@ -1,13 +1,31 @@
 # app/routers/products.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile, Form
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
+import asyncio
+import json
 
 from app.deps.auth import get_current_user
-from app.deps.permissions import can_manage_career_or_403, visible_careers_for
-from app.schemas.products import ProductCreate, ProductUpdate, ProductOut, ProductList
+from app.deps.permissions import can_manage_career_or_403, can_manage_career_or_403_async, visible_careers_for, require_platform_admin
+from app.deps.limits import rate_limit_user, rate_limit_ip, concurrency_limit
+from app.deps.offload import offload, offload_best_effort
+from app.config import (
+    RAG_SYNC_RATE_PER_MINUTE, RAG_SYNC_BURST,
+    UPLOAD_RATE_PER_MINUTE, UPLOAD_BURST, UPLOAD_MAX_CONCURRENCY, UPLOAD_MAX_QUEUE, UPLOAD_QUEUE_TIMEOUT_SECONDS,
+    PUBLIC_RATE_PER_MINUTE, PUBLIC_BURST,
+    PRODUCT_GALLERY_MAX_IMAGES, PRODUCT_BATCH_MAX_IDS,
+)
+from app.schemas.products import (
+    ProductCreate, ProductUpdate, ProductOut, ProductList, ProductChanges, ProductBatch, ProductBatchRequest,
+)
 from app.repositories import products_repo as repo
-from app.services.images import upload_image_and_get_url  # ✅ nuevo
-from app.core.rag_sync import sync_product_to_rag, delete_product_from_rag
+from app.repositories import changes_repo
+from app.services.images import upload_images
+from app.core.rag_sync import sync_product_to_rag, delete_product_from_rag, needs_rag_sync
+from app.services import rag_resync
+from app.core.profiling import ProfiledRoute
+from app.core import bulkhead
+from app.core.catalog_index import SortOption
 # Nota: Implementaremos la lógica de iteración aquí o en rag_sync, pero como rag_sync no ve el repo, 
 # lo haremos en el endpoint usando el repo.
 
@@ -52,58 +70,192 @@ def get_product(prod_id: str):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
 # lo haremos en el endpoint usando el repo.
 
-router = APIRouter(prefix="/api/products", tags=["products"])
+router = APIRouter(prefix="/api/products", tags=["products"], route_class=ProfiledRoute)
+
+# Admisión para endpoints costosos: subidas de imagen y resync completo del RAG
+_upload_limits = [
+    Depends(rate_limit_user("image-upload", UPLOAD_RATE_PER_MINUTE, UPLOAD_BURST)),
+    Depends(concurrency_limit("image-upload", UPLOAD_MAX_CONCURRENCY, UPLOAD_MAX_QUEUE, UPLOAD_QUEUE_TIMEOUT_SECONDS)),
+]
+# Endpoints públicos: sin uid, el bucket se identifica por IP
+_public_limits = (
+    [Depends(rate_limit_ip("public", PUBLIC_RATE_PER_MINUTE, PUBLIC_BURST))] if PUBLIC_RATE_PER_MINUTE > 0 else []
+)
+
+_PRODUCT_FIELDS = frozenset(ProductOut.__fields__)
+
+def _check_gallery_size(n: int):
+    if n > PRODUCT_GALLERY_MAX_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {PRODUCT_GALLERY_MAX_IMAGES} imágenes por producto.",
+        )
+
+def _form_gallery(images: Optional[List[str]]) -> Optional[List[str]]:
+    # los formularios mandan "" para vaciar la galería: las URLs en blanco se descartan
+    if images is None:
+        return None
+    return [url.strip() for url in images if url and url.strip()]
+
+async def _upload_form_images(
+    image_file: Optional[UploadFile], image_files: Optional[List[UploadFile]], convert_webp: bool
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Sube portada y galería en paralelo (acotado por el bulkhead `images`); el contenido
+    ya subido antes se resuelve por hash sin re-enviarlo. Devuelve (url_portada, urls_galería).
+    """
+    files = ([image_file] if image_file is not None else []) + list(image_files or [])
+    urls = await upload_images(
+        files, convert_webp=convert_webp, runner=lambda fn, *a, **kw: offload(bulkhead.images, fn, *a, **kw)
+    )
+    if image_file is not None:
+        return urls[0], urls[1:]
+    return None, urls
+
+def _list_or_400(**kwargs):
+    try:
+        return repo.list_products(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 # --- RUTA PÚBLICA (debe ir antes del detalle) ---
-@router.get("/public", response_model=ProductList, tags=["public"])
-def list_public_products(
+@router.get("/public", response_model=ProductList, tags=["public"], dependencies=_public_limits)
+async def list_public_products(
     q: Optional[str] = Query(None, description="Búsqueda simple en nombre/descripcion"),
     category: Optional[str] = Query(None),
     career: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
-    cursor: Optional[str] = Query(None, description="ISO datetime para paginación"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación (next_cursor de la página anterior)"),
+    sort: SortOption = Query("newest"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
 ):
-    items, next_cursor = repo.list_products(
-        q=q, category=category, career=career, limit=limit, cursor_iso=cursor, restrict_to_careers=None
+    items, next_cursor = await offload(
+        bulkhead.firestore, _list_or_400,
+        q=q, category=category, career=career, limit=limit, cursor_iso=cursor, restrict_to_careers=None,
+        sort=sort, min_price=min_price, max_price=max_price,
     )
     return {"items": items, "next_cursor": next_cursor}
 
 # --- LISTA AUTENTICADA ---
 @router.get("", response_model=ProductList)
-def list_products(
+async def list_products(
     q: Optional[str] = Query(None, description="Búsqueda simple en nombre/descripcion"),
     category: Optional[str] = Query(None),
     career: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=200),
-    cursor: Optional[str] = Query(None, description="ISO datetime para paginación"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación (next_cursor de la página anterior)"),
+    sort: SortOption = Query("newest"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
     user=Depends(get_current_user),
 ):
-    restrict_to = visible_careers_for(user["uid"])
-    items, next_cursor = repo.list_products(
+    restrict_to = await offload(bulkhead.firestore, visible_careers_for, user["uid"])
+    items, next_cursor = await offload(
+        bulkhead.firestore, _list_or_400,
         q=q, category=category, career=career, limit=limit, cursor_iso=cursor,
         restrict_to_careers=restrict_to if career is None else None,
+        sort=sort, min_price=min_price, max_price=max_price,
     )
     return {"items": items, "next_cursor": next_cursor}
 
+# --- CHANGE FEED (debe ir antes del detalle) ---
+@router.get("/changes", response_model=ProductChanges, tags=["public"], dependencies=_public_limits)
+async def list_product_changes(
+    since: Optional[str] = Query(None, description="next_token de la llamada anterior; vacío = desde el inicio"),
+    limit: int = Query(200, ge=1, le=1000),
+):
+    """
+    Upserts y tombstones del catálogo en orden (updatedAt, id). Permite mantener una réplica
+    local transfiriendo solo lo que cambió; si `reset_required`, hay que relistar todo.
+    """
+    return await offload(bulkhead.firestore, _read_changes, since, limit)
+
+def _read_changes(since: Optional[str], limit: int):
+    try:
+        entries, next_token, has_more, reset_required = changes_repo.list_changes(since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if reset_required:
+        return {"changes": [], "next_token": None, "has_more": False, "reset_required": True}
+    # el feed versiona el contenido del catálogo; el stock cambia sin entrada en el feed
+    upserts = repo.get_products_by_ids((e["productId"] for e in entries if e["op"] == "upsert"), with_stock=False)
+    changes = []
+    for e in entries:
+        product = upserts.get(e["productId"]) if e["op"] == "upsert" else None
+        if e["op"] == "upsert" and product is None:
+            # borrado entre la lectura del log y la del producto: su tombstone llegará después
+            continue
+        changes.append({"id": e["productId"], "op": e["op"], "updatedAt": e["ts"], "product": product})
+    return {"changes": changes, "next_token": next_token, "has_more": has_more, "reset_required": False}
+
+# --- MULTI-GET POR IDS (debe ir antes del detalle) ---
+def _split_csv(values: Optional[List[str]]) -> Optional[List[str]]:
+    # acepta ?ids=a,b,c y también ?ids=a&ids=b
+    if values is None:
+        return None
+    return [v.strip() for raw in values for v in raw.split(",") if v.strip()]
+
+def _batch_or_400(ids: List[str], fields: Optional[List[str]]):
+    # un ID vacío o con "/" no es un documento de `products` (Firestore lo rechaza con ValueError)
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Se requiere al menos un ID.")
+    invalid = [pid for pid in ids if not pid or "/" in pid]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"IDs inválidos: {', '.join(repr(pid) for pid in invalid)}",
+        )
+    if len(set(ids)) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {PRODUCT_BATCH_MAX_IDS} IDs por llamada.",
+        )
+    if fields is not None:
+        unknown = [f for f in fields if f not in _PRODUCT_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Campos desconocidos: {', '.join(unknown)}",
+            )
+    items, missing = repo.get_products_batch(ids, fields)
+    return {"items": items, "missing": missing}
+
+@router.get("/batch", response_model=ProductBatch, tags=["public"], dependencies=_public_limits)
+async def get_products_batch(
+    ids: List[str] = Query(..., description="IDs separados por coma (o repetidos)"),
+    fields: Optional[List[str]] = Query(None, description="Proyección, p.ej. fields=name,price,image"),
+):
+    """
+    Varios productos en una sola llamada (wishlists, vistos recientemente, citas del chatbot).
+    Conserva el orden pedido, ignora IDs repetidos y lista aparte los que no existen.
+    """
+    return await offload(bulkhead.firestore, _batch_or_400, _split_csv(ids), _split_csv(fields))
+
+@router.post("/batch", response_model=ProductBatch, tags=["public"], dependencies=_public_limits)
+async def post_products_batch(body: ProductBatchRequest):
+    """Igual que GET /batch, para listas de IDs demasiado largas para la URL."""
+    return await offload(bulkhead.firestore, _batch_or_400, body.ids, body.fields)
+
 # --- DETALLE AUTENTICADO ---
-@router.get("/{prod_id}", response_model=ProductOut, tags=["public"])
-def get_product(prod_id: str):
-    p = repo.get_product(prod_id)
+@router.get("/{prod_id}", response_model=ProductOut, tags=["public"], dependencies=_public_limits)
+async def get_product(prod_id: str):
+    p = await offload(bulkhead.firestore, repo.get_product, prod_id)
     if not p:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     return p
 
 # --- CREAR JSON (ya lo tenías) ---
 @router.post("", response_model=ProductOut, status_code=status.HTTP_201_CREATED)
-def create_product(payload: ProductCreate, user=Depends(get_current_user)):
-    can_manage_career_or_403(user["uid"], payload.career)
-    created = repo.create_product(payload.dict(), uid=user["uid"])
-    # RAG Sync
-    sync_product_to_rag(created)
+async def create_product(payload: ProductCreate, user=Depends(get_current_user)):
+    await can_manage_career_or_403_async(user["uid"], payload.career)
+    created = await offload(bulkhead.firestore, repo.create_product, payload.dict(), uid=user["uid"])
+    # RAG Sync (si el RAG está lento o saturado, el resync lo pondrá al día)
+    await offload_best_effort(bulkhead.rag, sync_product_to_rag, created)
     return created
 
 # --- CREAR con FORM-DATA + archivo (NUEVO) ---
-@router.post("/form", response_model=ProductOut, status_code=status.HTTP_201_CREATED)
+@router.post("/form", response_model=ProductOut, status_code=status.HTTP_201_CREATED, dependencies=_upload_limits)
 async def create_product_form(
     name: str = Form(...),
     price: float = Form(...),
@@ -115,14 +267,20 @@ async def create_product_form(
     image_url: Optional[str] = Form(None),
     convert_webp: bool = Form(True),
     image_file: Optional[UploadFile] = File(None),
+    # galería: URLs ya subidas + archivos nuevos (se agregan en ese orden)
+    images: Optional[List[str]] = Form(None),
+    image_files: Optional[List[UploadFile]] = File(None),
     user=Depends(get_current_user),
 ):
-    can_manage_career_or_403(user["uid"], career)
+    await can_manage_career_or_403_async(user["uid"], career)
+    images = _form_gallery(images)
+    _check_gallery_size(len(images or []) + len(image_files or []))
 
-    # Si llega archivo → subir y obtener URL
-    final_image = image_url or ""
-    if image_file is not None:
-        final_image = await upload_image_and_get_url(image_file, convert_webp=convert_webp)
+    # Si llegan archivos → subir (en paralelo) y obtener URLs
+    cover_url, gallery_urls = await _upload_form_images(image_file, image_files, convert_webp)
+    gallery = list(dict.fromkeys(list(images or []) + gallery_urls))  # sin URLs repetidas
+    # sin portada explícita, la primera imagen de la galería hace de portada
+    final_image = cover_url or image_url or (gallery[0] if gallery else "")
 
     payload = {
         "name": name,
@@ -132,28 +290,43 @@ async def create_product_form(
         "career": career,
         "stock": stock,
         "image": final_image,
+        "images": gallery,
     }
-    created = repo.create_product(payload, uid=user["uid"])
+    created = await offload(bulkhead.firestore, repo.create_product, payload, uid=user["uid"])
     # RAG Sync
-    sync_product_to_rag(created)
+    await offload_best_effort(bulkhead.rag, sync_product_to_rag, created)
     return created
 
 # --- ACTUALIZAR JSON (ya lo tenías) ---
+def _or_409(fn, *args, **kwargs):
+    """Corre una escritura condicional del repo; si otro escritor se adelantó → 409."""
+    try:
+        return fn(*args, **kwargs)
+    except repo.ProductConflict:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El producto fue modificado por otra persona. Vuelve a cargarlo e inténtalo de nuevo.",
+        )
+
 @router.put("/{prod_id}", response_model=ProductOut)
-def update_product(prod_id: str, payload: ProductUpdate, user=Depends(get_current_user)):
-    current = repo.get_product(prod_id)
-    if not current:
+async def update_product(prod_id: str, payload: ProductUpdate, user=Depends(get_current_user)):
+    # una sola lectura: el permiso se valida sobre el mismo estado que condiciona la escritura
+    def _authorize(current):
+        can_manage_career_or_403(user["uid"], payload.career or current["career"])
+
+    result = await offload(
+        bulkhead.firestore, _or_409, repo.update_product, prod_id, payload.dict(exclude_unset=True), check=_authorize
+    )
+    if result is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
-    target_career = payload.career or current["career"]
-    can_manage_career_or_403(user["uid"], target_career)
-    updated = repo.update_product(prod_id, payload.dict(exclude_unset=True))
-    assert updated is not None
-    # RAG Sync
-    sync_product_to_rag(updated)
+    current, updated = result
+    # RAG Sync (se omite si el texto indexado no cambió, p.ej. solo cambió el stock)
+    if needs_rag_sync(current, updated):
+        await offload_best_effort(bulkhead.rag, sync_product_to_rag, updated)
     return updated
 
 # --- ACTUALIZAR con FORM-DATA + archivo (NUEVO) ---
-@router.put("/{prod_id}/form", response_model=ProductOut)
+@router.put("/{prod_id}/form", response_model=ProductOut, dependencies=_upload_limits)
 async def update_product_form(
     prod_id: str,
     name: Optional[str] = Form(None),
@@ -165,18 +338,31 @@ async def update_product_form(
     image_url: Optional[str] = Form(None),
     convert_webp: bool = Form(True),
     image_file: Optional[UploadFile] = File(None),
+    # galería: `images` (URLs) reemplaza la actual; `image_files` se agregan al final.
+    # Para conservar fotos al editar basta reenviar sus URLs, no los archivos.
+    images: Optional[List[str]] = Form(None),
+    image_files: Optional[List[UploadFile]] = File(None),
     user=Depends(get_current_user),
 ):
-    current = repo.get_product(prod_id)
-    if not current:
+    # lectura para escritura (sin caché): permisos y galería salen de aquí, y su update_time
+    # condiciona el update final (las subidas de imagen pueden tardar)
+    prior = await offload(bulkhead.firestore, repo.get_product_for_write, prod_id)
+    if not prior:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+    current = prior[0]
 
     target_career = career or current["career"]
-    can_manage_career_or_403(user["uid"], target_career)
+    await can_manage_career_or_403_async(user["uid"], target_career)
 
-    final_image = image_url  # si mandan URL directa, la usamos
-    if image_file is not None:
-        final_image = await upload_image_and_get_url(image_file, convert_webp=convert_webp)
+    images = _form_gallery(images)
+    touches_gallery = images is not None or bool(image_files)
+    base = list(images if images is not None else current.get("images") or [])
+    if touches_gallery:
+        _check_gallery_size(len(base) + len(image_files or []))
+
+    cover_url, gallery_urls = await _upload_form_images(image_file, image_files, convert_webp)
+    final_image = cover_url or image_url  # si mandan URL directa, la usamos
+    gallery = list(dict.fromkeys(base + gallery_urls)) if touches_gallery else None
 
     update_payload = {
         "name": name,
@@ -185,39 +371,69 @@ async def update_product_form(
         "category": category,
         "career": career,
         "stock": stock,
-        # Solo setear 'image' si se envió url o archivo
+        # Solo setear 'image'/'images' si se enviaron
         **({"image": final_image} if final_image is not None else {}),
+        **({"images": gallery} if gallery is not None else {}),
     }
 
-    updated = repo.update_product(prod_id, update_payload)
-    assert updated is not None
-    # RAG Sync
-    sync_product_to_rag(updated)
+    _, updated = await offload(bulkhead.firestore, _or_409, repo.update_product, prod_id, update_payload, expect=prior[1])
+    # RAG Sync (se omite si el texto indexado no cambió, p.ej. solo cambió el stock)
+    if needs_rag_sync(current, updated):
+        await offload_best_effort(bulkhead.rag, sync_product_to_rag, updated)
     return updated
 
 # DELETE /api/products/{id}
 @router.delete("/{prod_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(prod_id: str, user=Depends(get_current_user)):
-    current = repo.get_product(prod_id)
-    if not current:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
-    can_manage_career_or_403(user["uid"], current["career"])
-    ok = repo.delete_product(prod_id)
-    if not ok:
+async def delete_product(prod_id: str, user=Depends(get_current_user)):
+    def _authorize(current):
+        can_manage_career_or_403(user["uid"], current["career"])
+
+    deleted = await offload(bulkhead.firestore, _or_409, repo.delete_product, prod_id, check=_authorize)
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     # RAG Sync
-    delete_product_from_rag(prod_id)
+    await offload_best_effort(bulkhead.rag, delete_product_from_rag, prod_id)
     return
 
 # --- FORCE SYNC (ADMIN TOOL) ---
-@router.post("/force-rag-sync", tags=["admin"])
-def force_rag_sync():
+@router.post(
+    "/force-rag-sync",
+    tags=["admin"],
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[
+        Depends(require_platform_admin),
+        Depends(rate_limit_user("force-rag-sync", RAG_SYNC_RATE_PER_MINUTE, RAG_SYNC_BURST)),
+        Depends(concurrency_limit("force-rag-sync", max_concurrent=1)),
+    ],
+)
+async def force_rag_sync(restart: bool = Query(False, description="Ignorar el checkpoint y empezar desde cero")):
     """
-    Recorre TODOS los productos y regenera sus embeddings en Supabase.
-    Puede tardar si hay muchos productos.
+    Lanza en segundo plano el recorrido de TODOS los productos para regenerar sus embeddings
+    en Supabase. Si una corrida anterior quedó a medias, continúa desde su checkpoint.
+    El progreso se consulta en /force-rag-sync/status o /force-rag-sync/events (SSE).
     """
-    count = 0
-    for product in repo.iter_all_products():
-        sync_product_to_rag(product)
-        count += 1
-    return {"status": "ok", "synced_count": count}
\ No newline at end of file
+    try:
+        return await offload(bulkhead.firestore, rag_resync.start, restart=restart)
+    except rag_resync.RagResyncBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay un resync en curso en otra instancia.")
+
+@router.get("/force-rag-sync/status", tags=["admin"], dependencies=[Depends(require_platform_admin)])
+async def force_rag_sync_status():
+    return await offload(bulkhead.firestore, rag_resync.get_status)
+
+@router.get("/force-rag-sync/events", tags=["admin"], dependencies=[Depends(require_platform_admin)])
+async def force_rag_sync_events(interval: float = Query(1.0, ge=0.2, le=30)):
+    """Progreso del resync como Server-Sent Events; el stream termina cuando el job deja de correr."""
+    async def _stream():
+        while True:
+            state = await offload(bulkhead.firestore, rag_resync.get_status)
+            yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+            if state.get("status") != "running":
+                return
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
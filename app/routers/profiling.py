@@ -0,0 +1,60 @@
+# app/routers/profiling.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.config import PROFILER_MAX_SECONDS
+from app.core import bulkhead, profiling
+from app.deps.limits import limiter_stats
+from app.deps.permissions import require_platform_admin
+
+PREFIX = "/api/admin/profiling"
+
+router = APIRouter(prefix=PREFIX, tags=["admin"], dependencies=[Depends(require_platform_admin)])
+
+# --- MUESTREO DE STACKS ---
+@router.post("/sample", response_class=PlainTextResponse)
+async def sample_stacks(
+    seconds: float = Query(5.0, gt=0, le=PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    include_idle: bool = Query(False, description="Incluir hilos bloqueados esperando trabajo"),
+):
+    """
+    Muestrea los stacks de todos los hilos durante `seconds` y devuelve el formato
+    colapsado (`hilo;módulo:función;... N`), p.ej. `flamegraph.pl perfil.txt > perfil.svg`.
+    """
+    try:
+        result = await profiling.sample_stacks_async(seconds, interval_ms / 1000, include_idle)
+    except profiling.ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ya hay un muestreo en curso.")
+    return PlainTextResponse(
+        profiling.to_collapsed_text(result["stacks"]),
+        headers={"X-Profile-Samples": str(result["samples"]), "X-Profile-Duration": str(result["duration_s"])},
+    )
+
+# --- PETICIONES LENTAS ---
+@router.get("/slow-requests")
+def list_slow_requests():
+    return profiling.recorder.snapshot()
+
+@router.put("/slow-requests")
+def configure_slow_requests(
+    enabled: Optional[bool] = Query(None),
+    capacity: Optional[int] = Query(None, ge=1, le=1000),
+):
+    profiling.recorder.configure(enabled=enabled, capacity=capacity)
+    return profiling.recorder.snapshot()
+
+@router.delete("/slow-requests", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_requests():
+    profiling.recorder.clear()
+    return
+
+# --- BULKHEADS ---
+@router.get("/bulkheads")
+def bulkhead_stats():
+    """
+    Ocupación de cada bulkhead (en ejecución, en cola, rechazos y timeouts) y, bajo
+    `limiters`, la de los limitadores de concurrencia de los endpoints (p.ej. uploads).
+    """
+    return {**bulkhead.stats(), "limiters": limiter_stats()}
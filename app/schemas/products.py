@@ -1,23 +1,31 @@
 # app/schemas/products.py
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Literal
 from datetime import datetime
 
-class ProductBase(BaseModel):
+from app.config import PRODUCT_GALLERY_MAX_IMAGES
+
+class ProductFields(BaseModel):
+    """Contenido del catálogo (sin inventario)."""
     name: str = Field(..., min_length=1, max_length=200)
     description: Optional[str] = Field("", max_length=2000)
     price: float = Field(..., ge=0)
     category: str = Field(..., min_length=1, max_length=100)
     career: str = Field(..., min_length=1, max_length=50)  # clave de carrera (p.ej. "SIS")
-    stock: int = Field(0, ge=0)
     image: Optional[str] = ""
+    images: List[str] = Field(default_factory=list)  # galería (URLs); `image` es la portada
 
     @validator("category", "career")
     def strip_lower(cls, v: str):
         return v.strip()
 
+class ProductBase(ProductFields):
+    stock: int = Field(0, ge=0)
+
 class ProductCreate(ProductBase):
-    pass
+    # el tope va en la entrada, no en ProductFields: así ProductOut no falla con productos
+    # guardados antes de bajar PRODUCT_GALLERY_MAX_IMAGES
+    images: List[str] = Field(default_factory=list, max_items=PRODUCT_GALLERY_MAX_IMAGES)
 
 class ProductUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=200)
@@ -27,6 +35,7 @@ class ProductUpdate(BaseModel):
     career: Optional[str] = Field(None, min_length=1, max_length=50)
     stock: Optional[int] = Field(None, ge=0)
     image: Optional[str] = None
+    images: Optional[List[str]] = Field(None, max_items=PRODUCT_GALLERY_MAX_IMAGES)
 
 class ProductOut(ProductBase):
     id: str
@@ -34,13 +43,44 @@ class ProductOut(ProductBase):
     updatedAt: datetime
     createdBy: Optional[str] = None
 
+class ProductContentOut(ProductFields):
+    """Producto sin `stock`: lo que versiona el catálogo (el stock se lee en vivo)."""
+    id: str
+    createdAt: datetime
+    updatedAt: datetime
+    createdBy: Optional[str] = None
+
 class ProductList(BaseModel):
     items: List[ProductOut]
-    next_cursor: Optional[str] = None  # opcional para paginación sencilla por fecha
+    next_cursor: Optional[str] = None  # cursor opaco y estable para la siguiente página
 
 class ProductFilters(BaseModel):
     q: Optional[str] = None
     category: Optional[str] = None
     career: Optional[str] = None
     limit: int = 50
-    cursor: Optional[str] = None  # ISO datetime para start_after (createdAt)
+    cursor: Optional[str] = None  # next_cursor de la página anterior (acepta también ISO datetime)
+    sort: str = "newest"  # newest | price_asc | price_desc | name
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+class ProductChange(BaseModel):
+    id: str
+    op: Literal["upsert", "delete"]
+    updatedAt: datetime  # momento del cambio (para "delete", cuándo se borró)
+    # solo en "upsert"; sin stock: sus cambios no pasan por el feed (leerlo con /batch?fields=stock)
+    product: Optional[ProductContentOut] = None
+
+class ProductChanges(BaseModel):
+    changes: List[ProductChange]
+    next_token: Optional[str] = None  # pásalo como ?since= en la próxima llamada
+    has_more: bool = False
+    reset_required: bool = False  # el token es anterior a la compactación: relistar todo
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_items=1)
+    fields: Optional[List[str]] = None  # proyección; None = todos los campos
+
+class ProductBatch(BaseModel):
+    items: List[Dict[str, Any]]  # en el orden pedido; con `fields`, solo esos campos (+ id)
+    missing: List[str] = []
@@ -0,0 +1,111 @@
+# app/services/cart_compaction.py
+"""
+Compactación de carritos como job en segundo plano.
+
+Recorre `carts` por páginas (orden de ID de documento, con checkpoint en
+`jobs/cart_compaction`) y, por página:
+  - comprueba en bloque qué productos referenciados siguen existiendo (get_all sin campos),
+  - quita de cada carrito los ítems cuyo producto ya no existe,
+  - borra los carritos sin actividad hace más de CART_IDLE_TTL_DAYS (o que quedaron vacíos),
+todo con un BulkWriter y precondición `last_update_time`, para no pisar un carrito que el
+usuario modificó mientras tanto. El ritmo lo acota un token bucket (carritos/seg).
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import (
+    CART_IDLE_TTL_DAYS,
+    CART_COMPACTION_PAGE_SIZE,
+    CART_COMPACTION_RATE_PER_SECOND,
+    CART_COMPACTION_STALE_SECONDS,
+)
+from app.core.catalog_snapshot import to_micros
+from app.core.ratelimit import get_rate_limit_store
+from app.repositories import cart_repo, products_repo
+from app.services.jobs import JobBusy, ResumableJob
+
+_COUNTERS = ("scanned", "pruned_items", "pruned_carts", "deleted_idle", "deleted_empty", "conflicts", "errors")
+
+
+class CartCompactionBusy(JobBusy):
+    """Otro proceso tiene una compactación en curso (heartbeat reciente)."""
+
+
+def _throttle(n: int) -> None:
+    """Token bucket compartido (mismo store que los rate limits de la API)."""
+    store = get_rate_limit_store()
+    burst = max(CART_COMPACTION_PAGE_SIZE, 1)
+    while True:
+        wait = store.consume("job:cart-compaction", CART_COMPACTION_RATE_PER_SECOND, burst, cost=min(n, burst))
+        if not wait:
+            return
+        time.sleep(wait)
+
+def _last_activity(doc) -> Optional[int]:
+    data = doc.to_dict() or {}
+    return to_micros(data.get("updatedAt") or doc.update_time)
+
+def _plan_page(
+    docs: List[Any], idle_before_micros: int
+) -> Tuple[List[Tuple[str, Any]], List[Tuple[str, Any, List[str]]], Dict[str, Dict[str, int]]]:
+    """
+    Decide qué hacer con una página: (borrados, podas, contadores por carrito). Los
+    contadores de un carrito solo se suman si su escritura se aplicó.
+    """
+    referenced = {pid for doc in docs for pid in ((doc.to_dict() or {}).get("items") or {})}
+    alive = products_repo.existing_ids(referenced) if referenced else set()
+    deletes, prunes = [], []
+    outcomes: Dict[str, Dict[str, int]] = {}
+    for doc in docs:
+        items = (doc.to_dict() or {}).get("items") or {}
+        last = _last_activity(doc)
+        if last is not None and last < idle_before_micros:
+            deletes.append((doc.id, doc.update_time))
+            outcomes[doc.id] = {"deleted_idle": 1}
+            continue
+        dangling = [pid for pid in items if pid not in alive]
+        if not dangling:
+            continue
+        if len(dangling) == len(items):
+            # sin ningún producto vigente: el carrito queda vacío, se borra
+            deletes.append((doc.id, doc.update_time))
+            outcomes[doc.id] = {"deleted_empty": 1}
+        else:
+            prunes.append((doc.id, doc.update_time, dangling))
+            outcomes[doc.id] = {"pruned_carts": 1, "pruned_items": len(dangling)}
+    return deletes, prunes, outcomes
+
+def _idle_before() -> int:
+    return to_micros(datetime.now(timezone.utc) - timedelta(days=CART_IDLE_TTL_DAYS))
+
+def _step(state: Dict[str, Any]) -> int:
+    page = cart_repo.list_carts_after(state["last_doc_id"], CART_COMPACTION_PAGE_SIZE)
+    if not page:
+        return 0
+    _throttle(len(page))
+    deletes, prunes, outcomes = _plan_page(page, _idle_before())
+    applied = cart_repo.apply_compaction(deletes, prunes)
+    for uid in applied["written"]:
+        for key, n in outcomes[uid].items():
+            state[key] += n
+    # lo planificado que no se aplicó queda en conflicts/errors y se reevalúa en la próxima corrida
+    state["conflicts"] += applied["conflicts"]
+    state["errors"] += applied["errors"]
+    state["last_doc_id"] = page[-1].id
+    return len(page)
+
+
+_job = ResumableJob(
+    "cart_compaction",
+    step=_step,
+    total=cart_repo.count_carts,
+    stale_seconds=CART_COMPACTION_STALE_SECONDS,
+    progress_key="scanned",
+    counters=_COUNTERS,
+    busy_error=CartCompactionBusy,
+    extra_state=lambda: {"idle_ttl_days": CART_IDLE_TTL_DAYS},
+)
+get_status = _job.get_status
+start = _job.start
+start_scheduler = _job.start_scheduler
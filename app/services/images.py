@@ -1,7 +1,98 @@
 # app/services/images.py
-import httpx
+"""
+Subida de imágenes al servicio externo.
+
+- Deduplicación por contenido: el archivo se hashea (SHA-256) mientras se lee en bloques
+  y un índice local hash → URL evita volver a subir bytes idénticos (p.ej. al editar un
+  producto y reenviar la misma foto).
+- Un único `httpx.AsyncClient` compartido (pool de conexiones reutilizado); el
+  paralelismo lo acota el bulkhead `images`.
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
 from fastapi import UploadFile
-from app.config import IMAGE_SERVICE_BASE_URL
+from app.config import IMAGE_SERVICE_BASE_URL, IMAGE_DEDUP_INDEX_SIZE
+
+_READ_CHUNK = 1024 * 1024
+Runner = Callable[..., Awaitable[Any]]
+
+_client = None
+_client_lock = asyncio.Lock()
+
+# (sha256, convert_webp) -> URL pública; LRU acotado por proceso
+_index: "OrderedDict[Tuple[str, bool], str]" = OrderedDict()
+_index_lock = threading.Lock()
+# subidas en curso por hash: dos peticiones con la misma foto comparten una sola subida
+_inflight: dict = {}
+
+
+def _index_get(key: Tuple[str, bool]) -> Optional[str]:
+    with _index_lock:
+        url = _index.get(key)
+        if url is not None:
+            _index.move_to_end(key)
+        return url
+
+
+def _index_put(key: Tuple[str, bool], url: str) -> None:
+    with _index_lock:
+        _index[key] = url
+        _index.move_to_end(key)
+        while len(_index) > IMAGE_DEDUP_INDEX_SIZE:
+            _index.popitem(last=False)
+
+
+async def _get_client():
+    global _client
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                import httpx  # diferido: no penalizar el arranque del servicio
+
+                _client = httpx.AsyncClient(timeout=30)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _read_and_hash(file: UploadFile) -> Tuple[bytes, str]:
+    """Lee el archivo en bloques calculando el SHA-256 al vuelo."""
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = await file.read(_READ_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+
+async def _upload_bytes(content: bytes, filename: str, content_type: str, convert_webp: bool) -> str:
+    client = await _get_client()
+    upload_url = IMAGE_SERVICE_BASE_URL.rstrip("/") + "/images/upload-image/"
+    files = {"file": (filename, content, content_type)}
+    data = {"convert_webp": "true" if convert_webp else "false"}
+
+    resp = await client.post(upload_url, files=files, data=data)
+    resp.raise_for_status()
+    payload = resp.json()
+    img_id = payload.get("id")
+    if not img_id:
+        raise RuntimeError("El servicio de imágenes no devolvió 'id'.")
+
+    # Construye la URL pública
+    return IMAGE_SERVICE_BASE_URL.rstrip("/") + f"/images/{img_id}"
+
 
 async def upload_image_and_get_url(
     file: UploadFile,
@@ -9,22 +100,39 @@ async def upload_image_and_get_url(
 ) -> str:
     """
     Sube la imagen al servicio externo y devuelve la URL pública final.
+    Si ya se subió un archivo con el mismo contenido, devuelve su URL sin re-subirlo.
     """
-    upload_url = IMAGE_SERVICE_BASE_URL.rstrip("/") + "/images/upload-image/"
-    async with httpx.AsyncClient(timeout=30) as client:
-        # Importantísimo: leer el archivo antes de enviarlo
-        content = await file.read()
-        files = {
-            "file": (file.filename or "upload", content, file.content_type or "application/octet-stream")
-        }
-        data = {"convert_webp": "true" if convert_webp else "false"}
-
-        resp = await client.post(upload_url, files=files, data=data)
-        resp.raise_for_status()
-        payload = resp.json()
-        img_id = payload.get("id")
-        if not img_id:
-            raise RuntimeError("El servicio de imágenes no devolvió 'id'.")
-
-        # Construye la URL pública
-        return IMAGE_SERVICE_BASE_URL.rstrip("/") + f"/images/{img_id}"
+    content, sha = await _read_and_hash(file)
+    key = (sha, convert_webp)
+    url = _index_get(key)
+    if url is not None:
+        return url
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_upload_and_index(
+            key, content, file.filename or "upload", file.content_type or "application/octet-stream"
+        ))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: si esta petición se cancela (timeout), la subida compartida sigue para las demás
+    return await asyncio.shield(task)
+
+
+async def _upload_and_index(key: Tuple[str, bool], content: bytes, filename: str, content_type: str) -> str:
+    url = await _upload_bytes(content, filename, content_type, convert_webp=key[1])
+    _index_put(key, url)
+    return url
+
+
+async def upload_images(files: List[UploadFile], convert_webp: bool = True, runner: Optional[Runner] = None) -> List[str]:
+    """
+    Sube varias imágenes en paralelo, devolviendo las URLs en el orden recibido. Con
+    `runner` (p.ej. el bulkhead `images`) cada subida ocupa un cupo, lo que acota el paralelismo.
+    """
+    async def _one(f: UploadFile) -> str:
+        if runner is None:
+            return await upload_image_and_get_url(f, convert_webp=convert_webp)
+        return await runner(upload_image_and_get_url, f, convert_webp=convert_webp)
+
+    return list(await asyncio.gather(*(_one(f) for f in files)))
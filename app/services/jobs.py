@@ -0,0 +1,207 @@
+# app/services/jobs.py
+"""
+Base común de los jobs en segundo plano reanudables (resync del RAG, compactación de carritos).
+
+El estado vive en `jobs/<nombre>`: checkpoint (`last_doc_id`), contadores y heartbeat.
+Cada job solo aporta su `step`: procesa la página siguiente al checkpoint, actualiza sus
+contadores y `last_doc_id`, y devuelve cuántos documentos recorrió (0 = terminó). Si una
+página puede tardar más que `stale_seconds`, el step llama a `heartbeat(state)` entre
+documentos para que no parezca muerto. El resto (arranque/reanudación, detección de un
+runner muerto por heartbeat viejo, progreso, ETA, checkpoint por página, programación
+periódica) es igual para todos.
+
+El job se toma con una escritura condicional (`create` si no existe, o precondición
+`last_update_time` sobre el estado leído): si dos instancias lo ven libre a la vez, solo
+una gana. Los checkpoints también son condicionales, así que un runner colgado al que
+otra instancia relevó se entera en su siguiente escritura y se detiene sin pisarla.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Type
+
+from app.core.firebase import firestore_db
+
+logger = logging.getLogger(__name__)
+
+_JOBS_COLLECTION = "jobs"
+
+Step = Callable[[Dict[str, Any]], int]
+
+
+class JobBusy(Exception):
+    """Otro proceso tiene el job en curso (heartbeat reciente)."""
+
+
+class JobLost(Exception):
+    """Otra instancia tomó el job (nuestro heartbeat quedó viejo): este runner debe parar."""
+
+
+class ResumableJob:
+    def __init__(
+        self,
+        name: str,
+        step: Step,
+        total: Callable[[], int],
+        stale_seconds: float,
+        progress_key: str = "processed",
+        counters: Iterable[str] = (),
+        busy_error: Type[JobBusy] = JobBusy,
+        extra_state: Optional[Callable[[], Dict[str, Any]]] = None,
+    ):
+        self.name = name
+        self.step = step
+        self.total = total
+        self.stale_seconds = stale_seconds
+        self.progress_key = progress_key
+        # el contador de progreso va primero; el resto son propios del job
+        self.counters = (progress_key, *[c for c in counters if c != progress_key])
+        self.busy_error = busy_error
+        self.extra_state = extra_state
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state: Optional[Dict[str, Any]] = None
+        self._update_time = None  # del último write propio al doc del job (precondición)
+
+    # -- persistencia --------------------------------------------------------
+    def _ref(self):
+        return firestore_db.collection(_JOBS_COLLECTION).document(self.name)
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        doc = self._ref().get()
+        return doc.to_dict() if doc.exists else None
+
+    def _claim(self, state: Dict[str, Any], snap) -> None:
+        """Toma el job solo si nadie escribió su doc desde que lo leímos."""
+        from google.api_core.exceptions import Conflict, FailedPrecondition
+
+        state["heartbeat_at"] = time.time()
+        try:
+            if snap.exists:
+                option = firestore_db.write_option(last_update_time=snap.update_time)
+                result = self._ref().update(dict(state), option=option)
+            else:
+                result = self._ref().create(dict(state))
+        except (Conflict, FailedPrecondition):
+            raise self.busy_error()
+        self._update_time = result.update_time
+
+    def _save(self, state: Dict[str, Any]) -> None:
+        from google.api_core.exceptions import FailedPrecondition
+
+        state["heartbeat_at"] = time.time()
+        option = firestore_db.write_option(last_update_time=self._update_time)
+        try:
+            self._update_time = self._ref().update(dict(state), option=option).update_time
+        except FailedPrecondition:
+            raise JobLost()
+
+    def heartbeat(self, state: Dict[str, Any]) -> None:
+        """
+        Refresca el heartbeat a mitad de un step (como mucho cada `stale_seconds / 4`), sin mover
+        el checkpoint. Lanza `JobLost` si otra instancia ya tomó el job.
+        """
+        if time.time() - state.get("heartbeat_at", 0) >= self.stale_seconds / 4:
+            self._save(state)
+
+    def _is_stale(self, state: Dict[str, Any]) -> bool:
+        return time.time() - state.get("heartbeat_at", 0) > self.stale_seconds
+
+    # -- estado --------------------------------------------------------------
+    def _running_here(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _with_progress(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrega throughput (docs/s de la corrida actual) y ETA estimada."""
+        out = dict(state)
+        until = time.time() if self._running_here() else (out.get("heartbeat_at") or 0)
+        elapsed = until - (out.get("run_started_at") or until)
+        rate = out.get(f"run_{self.progress_key}", 0) / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, (out.get("total") or 0) - (out.get(self.progress_key) or 0))
+        out["throughput_per_s"] = round(rate, 2)
+        out["eta_seconds"] = round(remaining / rate, 1) if rate > 0 and out.get("status") == "running" else None
+        return out
+
+    def get_status(self) -> Dict[str, Any]:
+        if self._running_here():
+            return self._with_progress(self._state)
+        state = self._load_state()
+        if not state:
+            return {"status": "idle", self.progress_key: 0, "total": None, "last_doc_id": None}
+        if state.get("status") == "running" and self._is_stale(state):
+            # el proceso que lo corría murió: queda reanudable desde el checkpoint
+            state["status"] = "interrupted"
+        return self._with_progress(state)
+
+    # -- ejecución -----------------------------------------------------------
+    def start(self, restart: bool = False) -> Dict[str, Any]:
+        """Arranca (o reanuda desde el checkpoint) el job. Idempotente si ya corre aquí."""
+        with self._lock:
+            if self._running_here():
+                return self._with_progress(self._state)
+            snap = self._ref().get()
+            persisted = snap.to_dict() if snap.exists else None
+            if persisted and persisted.get("status") == "running" and not self._is_stale(persisted):
+                raise self.busy_error()
+
+            now = time.time()
+            if restart or not persisted or persisted.get("status") == "completed":
+                state: Dict[str, Any] = {"last_doc_id": None, "started_at": now, **{c: 0 for c in self.counters}}
+            else:
+                state = {c: persisted.get(c) or 0 for c in self.counters}
+                state.update(last_doc_id=persisted.get("last_doc_id"), started_at=persisted.get("started_at"))
+            state.update(
+                status="running",
+                total=self.total(),
+                run_started_at=now,
+                error=None,
+                finished_at=None,
+                **{f"run_{self.progress_key}": 0},
+                **(self.extra_state() if self.extra_state else {}),
+            )
+            self._claim(state, snap)
+            self._state = state
+            self._thread = threading.Thread(target=self._run, args=(state,), name=self.name, daemon=True)
+            self._thread.start()
+            return self._with_progress(state)
+
+    def _run(self, state: Dict[str, Any]) -> None:
+        try:
+            while True:
+                n = self.step(state)
+                if not n:
+                    break
+                state[self.progress_key] += n
+                state[f"run_{self.progress_key}"] += n
+                self._save(state)  # checkpoint por página
+            state["status"] = "completed"
+            state["finished_at"] = time.time()
+        except JobLost:
+            return self._lost(state)
+        except Exception as e:
+            logger.exception("job %s falló en %s", self.name, state.get("last_doc_id"))
+            state["status"] = "failed"
+            state["error"] = str(e)
+        try:
+            self._save(state)
+        except JobLost:
+            self._lost(state)
+
+    def _lost(self, state: Dict[str, Any]) -> None:
+        # el doc del job ya es de otra instancia: no pisamos su estado
+        logger.warning("job %s: otra instancia tomó el job; este runner se detiene", self.name)
+        state["status"] = "lost"
+
+    def start_scheduler(self, interval_seconds: float) -> None:
+        """Lanza el job cada `interval_seconds` (si otra instancia ya lo corre, se salta)."""
+        def _loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.start()
+                except JobBusy:
+                    pass
+                except Exception:
+                    logger.exception("no se pudo lanzar el job %s", self.name)
+
+        threading.Thread(target=_loop, name=f"{self.name}-scheduler", daemon=True).start()
@@ -0,0 +1,70 @@
+# app/services/rag_resync.py
+"""
+Resync completo del catálogo con el RAG como job en segundo plano.
+
+El progreso se persiste (checkpoint) en `jobs/rag_resync` tras cada página, recorriendo
+`products` en orden de ID de documento: si el proceso muere a mitad, el siguiente
+`start()` continúa desde el último ID procesado en vez de re-embeber todo. Dentro de la
+página se refresca el heartbeat producto a producto (cada uno puede tardar hasta el timeout
+del bulkhead del RAG). Un producto que agota el timeout varias veces se salta y se cuenta en
+`skipped`; lo repara la próxima corrida o su siguiente edición.
+"""
+import logging
+import time
+from typing import Any, Dict
+
+from app.config import RAG_RESYNC_PAGE_SIZE, RAG_RESYNC_STALE_SECONDS
+from app.core.rag_sync import sync_product_to_rag
+from app.core import bulkhead
+from app.core.ratelimit import Overloaded
+from app.repositories import products_repo
+from app.services.jobs import JobBusy, ResumableJob
+
+logger = logging.getLogger(__name__)
+
+# intentos extra por producto cuando el RAG no responde dentro del timeout del bulkhead
+_TIMEOUT_RETRIES = 2
+
+
+class RagResyncBusy(JobBusy):
+    """Otro proceso tiene un resync en curso (heartbeat reciente)."""
+
+
+def _sync_one(product: Dict[str, Any], state: Dict[str, Any]) -> None:
+    # comparte el bulkhead del RAG con las ediciones en vivo; si está lleno, esperamos turno
+    timeouts = 0
+    while True:
+        _job.heartbeat(state)
+        try:
+            bulkhead.rag.call(sync_product_to_rag, product)
+            return
+        except Overloaded as e:
+            time.sleep(e.retry_after)
+        except bulkhead.BulkheadTimeout:
+            timeouts += 1
+            if timeouts > _TIMEOUT_RETRIES:
+                logger.warning("resync RAG: se salta %s tras %d timeouts", product.get("id"), timeouts)
+                state["skipped"] += 1
+                return
+
+def _step(state: Dict[str, Any]) -> int:
+    page = products_repo.list_products_after(state["last_doc_id"], RAG_RESYNC_PAGE_SIZE)
+    for product in page:
+        _sync_one(product, state)
+    if page:
+        # si falla a mitad de página, se reintenta la página entera (el upsert es idempotente)
+        state["last_doc_id"] = page[-1]["id"]
+    return len(page)
+
+
+_job = ResumableJob(
+    "rag_resync",
+    step=_step,
+    total=products_repo.count_products,
+    stale_seconds=RAG_RESYNC_STALE_SECONDS,
+    progress_key="processed",
+    counters=("skipped",),
+    busy_error=RagResyncBusy,
+)
+get_status = _job.get_status
+start = _job.start
@@ -0,0 +1,98 @@
+# benchmarks/api_bench.py
+"""
+Benchmark de carga/latencia de la API sobre el backend en memoria.
+
+    python -m benchmarks.api_bench --clients 32 --requests 2000 --latency-ms 5
+
+Reporta p50/p95/p99 y throughput para listado, detalle, carrito y mutaciones.
+"""
+import argparse
+import asyncio
+
+from benchmarks.harness import configure_env, print_report, run_scenario, seed
+
+
+def build_scenarios(data):
+    product_ids = data["product_ids"]
+    user_ids = data["user_ids"]
+    admin = {"Authorization": f"Bearer {data['admin_uid']}"}
+
+    def user_headers(rng):
+        return {"Authorization": f"Bearer {rng.choice(user_ids)}"}
+
+    async def list_public(client, rng):
+        return await client.get("/api/products/public", params={"limit": 50})
+
+    async def product_detail(client, rng):
+        return await client.get(f"/api/products/{rng.choice(product_ids)}")
+
+    async def hot_product_detail(client, rng):
+        # todos los clientes piden el mismo producto: mide la coalescencia de lecturas
+        return await client.get(f"/api/products/{product_ids[0]}")
+
+    async def cart_details(client, rng):
+        return await client.get("/api/cart/details", headers=user_headers(rng))
+
+    async def cart_add(client, rng):
+        body = {"productId": rng.choice(product_ids), "quantity": 1}
+        return await client.post("/api/cart/items", json=body, headers=user_headers(rng))
+
+    async def product_update(client, rng):
+        body = {"stock": rng.randint(0, 100)}
+        return await client.put(f"/api/products/{rng.choice(product_ids)}", json=body, headers=admin)
+
+    return {
+        "list_public": list_public,
+        "product_detail": product_detail,
+        "hot_product_detail": hot_product_detail,
+        "cart_details": cart_details,
+        "cart_add": cart_add,
+        "product_update": product_update,
+    }
+
+
+async def main_async(args) -> None:
+    from app.main import app
+
+    data = seed(args.products, args.users, args.items_per_cart)
+    scenarios = build_scenarios(data)
+    selected = args.scenario or list(scenarios)
+    results = []
+    for name in selected:
+        results.append(
+            await run_scenario(app, name, scenarios[name], args.clients, args.requests, warmup=args.warmup)
+        )
+    meta = {
+        "clients": args.clients,
+        "requests": args.requests,
+        "latency_ms": args.latency_ms,
+        "products": args.products,
+        "users": args.users,
+    }
+    print_report(results, as_json=args.json, meta=meta)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="clientes concurrentes")
+    parser.add_argument("--requests", type=int, default=1000, help="peticiones por escenario")
+    parser.add_argument("--warmup", type=int, default=20, help="peticiones de calentamiento por escenario")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="latencia inyectada por RPC de Firestore")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--items-per-cart", type=int, default=5)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=["list_public", "product_detail", "hot_product_detail", "cart_details", "cart_add", "product_update"],
+        help="escenario a ejecutar (repetible); por defecto todos",
+    )
+    parser.add_argument("--json", action="store_true", help="salida en JSON para comparar corridas")
+    args = parser.parse_args()
+
+    configure_env(args.latency_ms)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# benchmarks/harness.py
+"""
+Utilidades compartidas por los benchmarks: arranque del servicio sobre el backend en
+memoria, seed de datos y ejecución de escenarios con clientes concurrentes vía ASGI.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BENCH_ADMIN_UID = "bench-admin"
+
+
+def configure_env(latency_ms: float) -> None:
+    """Debe llamarse ANTES de importar `app.*`: fuerza backend en memoria y apaga el RAG."""
+    os.environ["DATA_BACKEND"] = "memory"
+    os.environ["MEMORY_BACKEND_LATENCY_MS"] = str(latency_ms)
+    # Vacías (no ausentes) para que load_dotenv no las rellene desde un .env real
+    for var in ("OPENAI_API_KEY", "SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY"):
+        os.environ[var] = ""
+    # todos los clientes del benchmark comparten IP: el límite por IP de los públicos no aplica
+    os.environ["PUBLIC_RATE_PER_MINUTE"] = "0"
+
+
+def seed(n_products: int, n_users: int, items_per_cart: int, seed_value: int = 42) -> Dict[str, Any]:
+    """Puebla el backend en memoria sin latencia y devuelve IDs útiles para los escenarios."""
+    from app.core.firebase import firestore_db
+    from app.repositories import cart_repo, products_repo
+
+    rng = random.Random(seed_value)
+    latency, firestore_db.latency = firestore_db.latency, 0.0
+    try:
+        firestore_db.collection("roles").document(BENCH_ADMIN_UID).set(
+            {"roles": ["admin"], "platform_admin": True, "admin_careers": []}
+        )
+        careers = ["SIS", "ADM", "IND", "CIV", "MEC"]
+        categories = ["Libros", "Laboratorio", "Ropa", "Papelería"]
+        product_ids = []
+        for i in range(n_products):
+            created = products_repo.create_product(
+                {
+                    "name": f"Producto {i}",
+                    "description": "Descripción de prueba " * 8,
+                    "price": round(rng.uniform(5, 500), 2),
+                    "category": rng.choice(categories),
+                    "career": rng.choice(careers),
+                    "stock": rng.randint(0, 100),
+                    "image": f"https://img.example/{i}.webp",
+                },
+                uid=BENCH_ADMIN_UID,
+            )
+            product_ids.append(created["id"])
+        user_ids = [f"bench-user-{i}" for i in range(n_users)]
+        for uid in user_ids:
+            for pid in rng.sample(product_ids, min(items_per_cart, len(product_ids))):
+                cart_repo.add_item(uid, pid, rng.randint(1, 3))
+        firestore_db.rpc_count = 0
+    finally:
+        firestore_db.latency = latency
+    return {"product_ids": product_ids, "user_ids": user_ids, "admin_uid": BENCH_ADMIN_UID}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    duration_s: float
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    backend_rpcs: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+
+RequestFactory = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+async def run_scenario(
+    app,
+    name: str,
+    make_request: RequestFactory,
+    clients: int,
+    total_requests: int,
+    warmup: int = 0,
+    seed_value: int = 7,
+) -> ScenarioResult:
+    """Lanza `clients` corrutinas que comparten `total_requests` peticiones contra la app ASGI."""
+    from app.core.firebase import firestore_db
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        warm_rng = random.Random(seed_value)
+        for _ in range(warmup):
+            await make_request(client, warm_rng)
+
+        latencies: List[float] = []
+        status_codes: Dict[int, int] = {}
+        errors = 0
+        remaining = total_requests
+        rpc_before = getattr(firestore_db, "rpc_count", 0)
+
+        async def worker(worker_id: int):
+            nonlocal remaining, errors
+            rng = random.Random(seed_value * 1000 + worker_id)
+            while remaining > 0:
+                remaining -= 1
+                t0 = time.perf_counter()
+                try:
+                    resp = await make_request(client, rng)
+                    code = resp.status_code
+                except Exception:
+                    code = 0
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                status_codes[code] = status_codes.get(code, 0) + 1
+                if code == 0 or code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        duration = time.perf_counter() - start
+
+    latencies.sort()
+    return ScenarioResult(
+        name=name,
+        requests=len(latencies),
+        errors=errors,
+        duration_s=round(duration, 4),
+        throughput_rps=round(len(latencies) / duration, 1) if duration else 0.0,
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        p99_ms=round(percentile(latencies, 99), 2),
+        max_ms=round(latencies[-1], 2) if latencies else 0.0,
+        backend_rpcs=getattr(firestore_db, "rpc_count", 0) - rpc_before,
+        status_codes=status_codes,
+    )
+
+
+def print_report(results: List[ScenarioResult], as_json: bool = False, meta: Optional[Dict[str, Any]] = None) -> None:
+    if as_json:
+        print(json.dumps({"meta": meta or {}, "results": [asdict(r) for r in results]}, indent=2))
+        return
+    if meta:
+        print("  ".join(f"{k}={v}" for k, v in meta.items()))
+    header = f"{'scenario':<18}{'reqs':>7}{'errs':>6}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'rpcs':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.name:<18}{r.requests:>7}{r.errors:>6}{r.throughput_rps:>10.1f}"
+            f"{r.p50_ms:>9.2f}{r.p95_ms:>9.2f}{r.p99_ms:>9.2f}{r.max_ms:>9.2f}{r.backend_rpcs:>8}"
+        )
@@ -0,0 +1,93 @@
+# benchmarks/startup_bench.py
+"""
+Benchmark de arranque en frío: tiempo desde que se lanza el proceso de uvicorn hasta
+el primer `GET /health` exitoso, más el tiempo de `import app.main` por separado.
+
+    python -m benchmarks.startup_bench --runs 5
+    python -m benchmarks.startup_bench --backend firebase --no-warm-up
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+_IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _child_env(backend: str, warm_up: bool) -> dict:
+    env = dict(os.environ)
+    env["DATA_BACKEND"] = backend
+    env["WARM_CLIENTS_ON_STARTUP"] = "true" if warm_up else "false"
+    for var in ("OPENAI_API_KEY", "SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY"):
+        env[var] = ""
+    return env
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_health(env: dict, timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError(f"/health no respondió en {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _summary(label: str, values) -> str:
+    ms = [v * 1000 for v in values]
+    return (
+        f"{label:<20} min={min(ms):8.1f} ms  median={statistics.median(ms):8.1f} ms  max={max(ms):8.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", choices=["memory", "firebase"], default="memory")
+    parser.add_argument("--no-warm-up", action="store_true", help="desactiva el warm-up en el lifespan")
+    args = parser.parse_args()
+
+    env = _child_env(args.backend, warm_up=not args.no_warm_up)
+    imports = [measure_import(env) for _ in range(args.runs)]
+    health = [measure_first_health(env) for _ in range(args.runs)]
+    print(f"backend={args.backend}  warm_up={not args.no_warm_up}  runs={args.runs}")
+    print(_summary("import app.main", imports))
+    print(_summary("time-to-first-health", health))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# tests/test_catalog_index.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.catalog_index import CatalogIndex, encode_cursor
+
+_T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _product(pid: str, price: float, career: str = "sis", category: str = "libros", age: int = 0):
+    return {
+        "id": pid,
+        "name": f"Producto {pid}",
+        "description": "",
+        "price": price,
+        "category": category,
+        "career": career,
+        "createdAt": _T0 - timedelta(minutes=age),
+    }
+
+
+def _catalog(products):
+    index = CatalogIndex()
+    index.load(products)
+    return index
+
+
+def _all_pages(index: CatalogIndex, limit: int, **kw):
+    """Recorre todas las páginas siguiendo el cursor; devuelve los IDs en orden."""
+    ids, cursor = [], None
+    while True:
+        items, cursor = index.query(limit=limit, cursor=cursor, **kw)
+        ids.extend(p["id"] for p in items)
+        if cursor is None:
+            return ids
+
+
+# precios con empates (varios productos por precio) para que el cursor caiga en medio de uno
+_PRICED = [_product(f"p{i:02d}", price=float(10 * (i % 4))) for i in range(12)]
+
+
+@pytest.mark.parametrize("sort", ["price_asc", "price_desc"])
+@pytest.mark.parametrize("limit", [1, 2, 5])
+def test_price_paging_across_ties_with_price_range(sort, limit):
+    index = _catalog(_PRICED)
+    ids = _all_pages(index, limit, sort=sort, min_price=10, max_price=20)
+
+    in_range = [p for p in _PRICED if 10 <= p["price"] <= 20]
+    expected = sorted(in_range, key=lambda p: (p["price"], p["id"]), reverse=sort == "price_desc")
+    assert ids == [p["id"] for p in expected]
+
+
+def test_careers_are_merged_in_global_order():
+    products = [_product(f"p{i:02d}", price=float(i % 5), career=("sis", "ind", "civ")[i % 3]) for i in range(15)]
+    index = _catalog(products)
+
+    ids = _all_pages(index, 2, sort="price_asc", careers=["sis", "ind", "sis"])
+
+    wanted = [p for p in products if p["career"] in ("sis", "ind")]
+    assert ids == [p["id"] for p in sorted(wanted, key=lambda p: (p["price"], p["id"]))]
+
+
+@pytest.mark.parametrize(
+    "sort, value",
+    [("price_asc", "caro"), ("price_desc", True), ("name", 3), ("newest", "2024-01-01")],
+)
+def test_cursor_with_wrong_value_type_is_rejected(sort, value):
+    index = _catalog(_PRICED)
+    with pytest.raises(ValueError):
+        index.query(sort=sort, limit=2, cursor=encode_cursor(sort, (value, "p01")))
+
+
+def test_cursor_of_another_sort_starts_over():
+    index = _catalog(_PRICED)
+    _, cursor = index.query(sort="price_asc", limit=2)
+    first, _ = index.query(sort="name", limit=2)
+    assert index.query(sort="name", limit=2, cursor=cursor)[0] == first
+
+
+@pytest.mark.parametrize("sort", ["newest", "price_asc", "name"])
+def test_next_page_is_stable_when_catalog_changes_between_pages(sort):
+    products = [_product(f"p{i:02d}", price=float(i), age=i) for i in range(10)]
+    index = _catalog(products)
+    page1, cursor = index.query(sort=sort, limit=4)
+    page2_before, _ = index.query(sort=sort, limit=4, cursor=cursor)
+
+    # entre páginas: sale un producto ya entregado y entra uno que ordena antes del cursor
+    index.remove(page1[0]["id"])
+    index.upsert(_product("a00", price=-1.0, age=-1))
+
+    page2_after, _ = index.query(sort=sort, limit=4, cursor=cursor)
+    assert [p["id"] for p in page2_after] == [p["id"] for p in page2_before]
+
+    # los cambios después del cursor sí se reflejan: lo borrado de la página 2 ya no sale
+    index.remove(page2_before[-1]["id"])
+    page2_removed, _ = index.query(sort=sort, limit=4, cursor=cursor)
+    assert [p["id"] for p in page2_removed][:3] == [p["id"] for p in page2_before][:3]
+    assert page2_before[-1]["id"] not in [p["id"] for p in page2_removed]
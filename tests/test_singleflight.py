@@ -0,0 +1,130 @@
+# tests/test_singleflight.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+N = 16
+
+
+class _Backend:
+    """Backend falso: cuenta llamadas y tarda lo suficiente como para que todos se solapen."""
+
+    def __init__(self, delay: float = 0.2, error: Exception = None):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"id": "p1"}
+
+
+def _run_threads(sf: SingleFlight, backend: _Backend):
+    barrier = threading.Barrier(N)
+    results, errors = [], []
+
+    def _caller():
+        barrier.wait()
+        try:
+            results.append(sf.do("k", backend))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_caller) for _ in range(N)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+async def _gather_async(sf: SingleFlight, backend: _Backend):
+    return await asyncio.gather(*(sf.do_async("k", backend) for _ in range(N)), return_exceptions=True)
+
+
+def test_do_threads_share_one_backend_call():
+    sf, backend = SingleFlight(), _Backend()
+    results, errors = _run_threads(sf, backend)
+    assert errors == []
+    assert len(results) == N
+    assert backend.calls == 1
+    # todos reciben el mismo resultado
+    assert all(r is results[0] for r in results)
+
+
+def test_do_async_tasks_share_one_backend_call():
+    sf, backend = SingleFlight(), _Backend()
+    results = asyncio.run(_gather_async(sf, backend))
+    assert backend.calls == 1
+    assert results == [{"id": "p1"}] * N
+
+
+def test_do_exception_reaches_every_waiter_and_releases_key():
+    sf, backend = SingleFlight(), _Backend(error=ValueError("boom"))
+    results, errors = _run_threads(sf, backend)
+    assert results == []
+    assert len(errors) == N and all(isinstance(e, ValueError) for e in errors)
+    assert backend.calls == 1
+
+    # la clave quedó libre: la siguiente llamada vuelve al backend
+    backend.error = None
+    assert sf.do("k", backend) == {"id": "p1"}
+    assert backend.calls == 2
+
+
+def test_do_async_exception_reaches_every_waiter_and_releases_key():
+    sf, backend = SingleFlight(), _Backend(error=ValueError("boom"))
+    results = asyncio.run(_gather_async(sf, backend))
+    assert len(results) == N and all(isinstance(r, ValueError) for r in results)
+    assert backend.calls == 1
+
+    backend.error = None
+    assert asyncio.run(sf.do_async("k", backend)) == {"id": "p1"}
+    assert backend.calls == 2
+
+
+def test_do_async_runner_rejection_releases_followers():
+    sf, backend = SingleFlight(), _Backend()
+
+    async def _rejecting_runner(fn, *args):
+        await asyncio.sleep(0.05)  # deja que los seguidores se unan antes de rechazar
+        raise RuntimeError("bulkhead lleno")
+
+    async def _main():
+        leader = asyncio.ensure_future(sf.do_async("k", backend, runner=_rejecting_runner))
+        await asyncio.sleep(0)
+        followers = [sf.do_async("k", backend) for _ in range(N - 1)]
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    results = asyncio.run(_main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert backend.calls == 0
+    # y la clave no quedó tomada
+    assert asyncio.run(sf.do_async("k", backend)) == {"id": "p1"}
+
+
+def test_different_keys_do_not_coalesce():
+    sf, backend = SingleFlight(), _Backend(delay=0.05)
+
+    async def _main():
+        return await asyncio.gather(sf.do_async("a", backend), sf.do_async("b", backend))
+
+    asyncio.run(_main())
+    assert backend.calls == 2
+
+
+@pytest.mark.parametrize("n", [1, 2])
+def test_sequential_calls_are_not_cached(n):
+    sf, backend = SingleFlight(), _Backend(delay=0)
+    for _ in range(n):
+        sf.do("k", backend)
+    assert backend.calls == n